@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+from django.conf import global_settings
 import environ
 
 env = environ.Env(
@@ -26,6 +27,42 @@ SECRET_KEY = env('SECRET_KEY')
 DEBUG = env('DEBUG')
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', default=['127.0.0.1', 'localhost'])
 
+# How generate_pdf fills the J101 (see maintain/pdf_fill.py): 'pymupdf' burns the
+# answers into the pages and removes the form, 'acroform' keeps read-only form fields.
+PDF_ENGINE = env('PDF_ENGINE', default='pymupdf')
+
+# Background PDF rendering (see maintain/pdf_jobs.py). With PDF_ASYNC_RENDER on,
+# the downloads page submits a render job when the download button is clicked
+# and polls for it instead of waiting on generate_pdf. A job's PDF is deleted
+# when it is downloaded; unclaimed jobs are deleted after PDF_JOB_TTL seconds
+# by `manage.py clearpdfjobs`, which should run from cron.
+PDF_ASYNC_RENDER = env.bool('PDF_ASYNC_RENDER', default=True)
+# Threads in each process's render pool (pdf_fill.get_executor), which runs
+# both these jobs and the renders of the async generate_pdf view. Keep it at
+# least PDF_RENDER_CONCURRENCY, or renders holding a slot wait for a thread.
+PDF_RENDER_WORKERS = env.int('PDF_RENDER_WORKERS', default=2)
+PDF_JOB_DIR = env('PDF_JOB_DIR', default=str(BASE_DIR / 'pdf_jobs'))
+PDF_JOB_TTL = env.int('PDF_JOB_TTL', default=3600)
+
+# Admission control for renders in generate_pdf, download_bundle and PDF
+# jobs (see maintain/admission.py): at most PDF_RENDER_CONCURRENCY run at
+# once per process and PDF_RENDER_QUEUE more wait up to
+# PDF_RENDER_QUEUE_TIMEOUT seconds; any others get a 503 with Retry-After:
+# PDF_RENDER_RETRY_AFTER. PDF_RENDER_QUEUE also caps the render pool's queue.
+# Run gunicorn with --threads above the concurrency, so other pages still
+# have threads to run on.
+PDF_RENDER_CONCURRENCY = env.int('PDF_RENDER_CONCURRENCY', default=2)
+PDF_RENDER_QUEUE = env.int('PDF_RENDER_QUEUE', default=4)
+PDF_RENDER_QUEUE_TIMEOUT = env.float('PDF_RENDER_QUEUE_TIMEOUT', default=10.0)
+PDF_RENDER_RETRY_AFTER = env.int('PDF_RENDER_RETRY_AFTER', default=5)
+
+# Cache of rendered PDFs, keyed by a hash of their contents (see maintain/pdf_cache.py).
+# The in-memory tier is per process; set PDF_CACHE_DIR to share renders between
+# processes on disk. Cached PDFs hold personal data, so keep the TTL short.
+PDF_CACHE_MAX_BYTES = env.int('PDF_CACHE_MAX_BYTES', default=32 * 1024 * 1024)
+PDF_CACHE_DIR = env('PDF_CACHE_DIR', default=None)
+PDF_CACHE_TTL = env.int('PDF_CACHE_TTL', default=3600)
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -47,6 +84,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover everything else.
+    'maintain.timing.server_timing_middleware',
+    'maintain.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,21 +98,79 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'config.urls'
 
+# Prometheus metrics are served at /metrics (see maintain/metrics.py) to
+# staff and to scrapers sending `Authorization: Bearer <METRICS_TOKEN>`.
+# METRICS_PUBLIC opens them to anyone, e.g. when only an internal network
+# can reach the site. Under gunicorn, also set PROMETHEUS_MULTIPROC_DIR to
+# an empty directory so the counts of all workers are added up (see
+# gunicorn.conf.py).
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+METRICS_PUBLIC = env.bool('METRICS_PUBLIC', default=False)
+
+# Opt-in profiling of generate_pdf and claim_wizard (see maintain/profiling.py).
+# With PROFILING on, staff can send an `X-Profile: 1` header to profile a
+# request, and a PROFILE_SAMPLE_RATE fraction (0-1) of requests is profiled
+# at random. PROFILER is 'cprofile' (pstats files) or 'sampling' (collapsed
+# stacks for flame graphs). Only the newest PROFILE_KEEP profiles are kept in
+# PROFILE_DIR; staff can download them from /profiles/.
+PROFILING = env.bool('PROFILING', default=False)
+PROFILER = env('PROFILER', default='cprofile')
+PROFILE_SAMPLE_RATE = env.float('PROFILE_SAMPLE_RATE', default=0.0)
+PROFILE_DIR = env('PROFILE_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILE_KEEP = env.int('PROFILE_KEEP', default=50)
+
+# Per-request timings of the session, form, PDF and other stages (see
+# maintain/timing.py). SERVER_TIMING sends them to the browser in a
+# Server-Timing header; each request is also logged as a JSON line to the
+# 'maintain.timing' logger, which is silent at the default TIMING_LOG_LEVEL of
+# WARNING; set it to INFO to log every request.
+SERVER_TIMING = env.bool('SERVER_TIMING', default=True)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'maintain.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'maintain.timing': {
+            'handlers': ['console'],
+            'level': env('TIMING_LOG_LEVEL', default='WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Templates are compiled once per process and reused; in development
+            # the autoreloader clears them when a template changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
+# Text-like widgets are rendered from a per-process skeleton with only the
+# value filled in (see maintain/form_rendering.py).
+FORM_RENDERER = 'maintain.form_rendering.SkeletonRenderer'
+
 WSGI_APPLICATION = 'config.wsgi.application'
 
 
@@ -86,6 +184,31 @@ DATABASES = {
     }
 }
 
+# Sessions are kept in the database and only written when their contents change
+# (see maintain/session_backend.py). SESSION_CACHE puts a cache in front of the
+# database: 'locmem' for a single process only (other processes would read stale
+# sessions), or 'file' to share it between processes on one host.
+SESSION_ENGINE = 'maintain.session_backend'
+SESSION_CACHE = env('SESSION_CACHE', default='none')
+SESSION_CACHE_BACKENDS = {
+    'none': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'locmem': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sessions'},
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env('SESSION_CACHE_DIR', default=str(BASE_DIR / 'session_cache')),
+    },
+}
+SESSION_CACHE_ALIAS = 'sessions'
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sessions': SESSION_CACHE_BACKENDS[SESSION_CACHE],
+}
+
+# Claims (and the personal details in them) untouched for this many seconds are
+# deleted by `manage.py clearclaims`, which should run from cron alongside
+# clearsessions. By then the session pointing at the claim has expired too.
+CLAIM_RETENTION = env.int('CLAIM_RETENTION', default=global_settings.SESSION_COOKIE_AGE)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -128,6 +251,19 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# collectstatic writes content-hashed files, resized WebP/PNG copies of images
+# and gzipped copies of CSS/JS/SVG (see maintain/static_assets.py). With DEBUG
+# off, templates link to the hashed names, so run collectstatic before serving.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'maintain.static_assets.StaticAssetStorage'},
+}
+
+# Serve STATIC_ROOT from Django, for deployments with nothing in front of it
+# to do so. Otherwise the web server should send the .gz copies to clients
+# that accept them, and cache hashed names for a year.
+SERVE_STATIC = env.bool('SERVE_STATIC', default=False)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -14,10 +14,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from maintain import static_assets
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('maintain.urls')),
 ]
+
+if settings.SERVE_STATIC and not settings.DEBUG:
+    urlpatterns.insert(0, re_path(rf'^{settings.STATIC_URL.lstrip("/")}(?P<path>.*)$', static_assets.serve))
@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+
+"""
+gunicorn settings, picked up when gunicorn is started from this directory:
+
+    PROMETHEUS_MULTIPROC_DIR=/run/maintain-metrics gunicorn config.wsgi
+
+With PROMETHEUS_MULTIPROC_DIR set, each worker writes its metrics to
+files in that directory and /metrics adds them up (see maintain/metrics.py).
+"""
+
+import os
+from pathlib import Path
+
+from prometheus_client import multiprocess
+
+
+def on_starting(server):
+    # Counts left over from the last run would be added to this one's.
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        path = Path(multiproc_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        for db_file in path.glob('*.db'):
+            db_file.unlink()
+
+
+def child_exit(server, worker):
+    # Drops the exited worker's live gauges (the render queue); its
+    # counters and histograms are kept, so totals don't go backwards.
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Claim
+
+
+@admin.register(Claim)
+class ClaimAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'created_at', 'updated_at')
+    readonly_fields = ('token', 'created_at', 'updated_at')
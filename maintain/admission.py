@@ -0,0 +1,146 @@
+# maintain/admission.py
+
+"""
+Admission control for PDF rendering.
+
+Rendering a J101 takes far longer than any other request, so a burst of
+downloads can occupy every request thread in a worker and leave none for
+the wizard's pages. RenderLimiter lets at most `max_active` renders run
+in a process at a time. Up to `max_waiting` more wait for a slot, for at
+most `timeout` seconds; past that, requests are turned away at once with
+Overloaded, which the views answer with a 503 and a Retry-After header.
+
+Only renders are limited: a PDF served from pdf_cache never waits. A
+background PDF job (pdf_jobs.submit) holds its slot from submission until
+its render ends, so queued jobs count against the limit too.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+WAITING = metrics.PDF_RENDER_QUEUE.labels('waiting')
+ACTIVE = metrics.PDF_RENDER_QUEUE.labels('active')
+
+
+class Overloaded(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RenderLimiter:
+    def __init__(self, max_active, max_waiting, timeout, retry_after):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+        # How many requests were let in, had to wait first, were turned
+        # away because the queue was full, or gave up waiting.
+        self.counts = {'admitted': 0, 'queued': 0, 'rejected': 0, 'timed_out': 0}
+
+    @contextmanager
+    def slot(self):
+        """
+        Holds one of the render slots for the duration of the block.
+        Raises Overloaded if none can be had.
+        """
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """
+        slot() for async views. The wait for a slot happens on a thread,
+        so the event loop is not blocked.
+        """
+        acquiring = asyncio.ensure_future(sync_to_async(self.acquire, thread_sensitive=False)())
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The request was cancelled (e.g. the client went away) while
+            # waiting; hand back the slot if it is granted after all.
+            acquiring.add_done_callback(lambda f: f.cancelled() or f.exception() or self.release())
+            raise
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self):
+        with self.condition:
+            if self.active >= self.max_active:
+                if self.waiting >= self.max_waiting:
+                    self.reject('rejected', "render queue full")
+                self.count('queued')
+                self.waiting += 1
+                WAITING.inc()
+                deadline = time.monotonic() + self.timeout
+                try:
+                    while self.active >= self.max_active:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.reject('timed_out', "timed out waiting for a render slot")
+                        self.condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                    WAITING.dec()
+            self.active += 1
+            ACTIVE.inc()
+            self.count('admitted')
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            ACTIVE.dec()
+            self.condition.notify()
+
+    def count(self, outcome):
+        self.counts[outcome] += 1
+        metrics.PDF_RENDER_ADMISSIONS.labels(outcome).inc()
+
+    def reject(self, outcome, reason):
+        self.count(outcome)
+        logger.warning(
+            "PDF render refused (%s): %d active, %d waiting; %s",
+            reason, self.active, self.waiting, self.stats(),
+        )
+        raise Overloaded(reason, self.retry_after)
+
+    def stats(self):
+        with self.condition:
+            return dict(self.counts, active=self.active, waiting=self.waiting)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RenderLimiter(
+                    max_active=settings.PDF_RENDER_CONCURRENCY,
+                    max_waiting=settings.PDF_RENDER_QUEUE,
+                    timeout=settings.PDF_RENDER_QUEUE_TIMEOUT,
+                    retry_after=settings.PDF_RENDER_RETRY_AFTER,
+                )
+    return _limiter
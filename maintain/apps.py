@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class MaintainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'maintain'
+
+    def ready(self):
+        from .checks import check_pdf_field_map, check_profiler, check_render_pool
+        checks.register(check_pdf_field_map)
+        checks.register(check_profiler)
+        checks.register(check_render_pool)
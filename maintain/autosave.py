@@ -0,0 +1,95 @@
+# maintain/autosave.py
+
+"""
+Field-level validation for the wizard's autosave endpoint.
+
+The wizard saves each field as the user leaves it, so a patch holds only
+one or a few fields. Each one is validated with its form field's own
+clean() (and the form's clean_<field>() where there is one) instead of
+building and validating the whole step form. Checks that compare fields
+with each other (the forms' clean()) still run when the step is
+submitted with its Continue button.
+"""
+
+from django import forms
+
+from .claim_data import IGNORED_FIELDS
+
+
+def clean_field(form_class, name, raw_value):
+    """
+    Cleans one submitted value for the field `name` of form_class.
+    Raises forms.ValidationError if it is not valid.
+    """
+    field = form_class.base_fields[name]
+    value = field.clean(raw_value)
+    clean_method = getattr(form_class, f'clean_{name}', None)
+    if clean_method is not None:
+        # clean_<field>() methods read the value from self.cleaned_data.
+        form = form_class.__new__(form_class)
+        form.cleaned_data = {name: value}
+        value = clean_method(form)
+    return value
+
+
+def clean_patch(step_name, form_class, fields, list_length=0):
+    """
+    Validates a {field name: raw value} patch for one wizard step. For a
+    formset step, names are the formset's own (e.g. 'child_details-0-full_name'),
+    and may refer to the step's `list_length` stored records or to one new
+    record after them.
+
+    Returns (changes, saved, errors): the cleaned values in the shape
+    claims.patch_step() takes, the names that were accepted, and
+    {name: [messages]} for the rest.
+    """
+    is_formset = hasattr(form_class, 'management_form')
+    changes, saved, errors = {}, [], {}
+
+    for name, raw_value in fields.items():
+        if is_formset:
+            index, field_name = parse_formset_name(step_name, name)
+            target_form = form_class.form
+            if index is not None and index > list_length:
+                errors[name] = ["Fill in the earlier rows first."]
+                continue
+        else:
+            index, field_name = None, name
+            target_form = form_class
+
+        if field_name is None or field_name in IGNORED_FIELDS or field_name not in target_form.base_fields:
+            errors[name] = ["Unknown field."]
+            continue
+        if raw_value is not None and not isinstance(raw_value, str):
+            errors[name] = ["Expected a text value."]
+            continue
+
+        if raw_value in (None, ''):
+            # Clearing a field is always saved; required fields are
+            # enforced when the step is submitted.
+            value = None
+        else:
+            try:
+                value = clean_field(target_form, field_name, raw_value)
+            except forms.ValidationError as e:
+                errors[name] = e.messages
+                continue
+
+        if index is None:
+            changes[field_name] = value
+        else:
+            changes.setdefault(index, {})[field_name] = value
+        saved.append(name)
+
+    return changes, saved, errors
+
+
+def parse_formset_name(prefix, name):
+    """
+    Splits '<prefix>-<index>-<field>' into (index, field); returns
+    (None, None) for anything else.
+    """
+    parts = name.split('-')
+    if len(parts) != 3 or parts[0] != prefix or not (parts[1].isascii() and parts[1].isdigit()):
+        return None, None
+    return int(parts[1]), parts[2]
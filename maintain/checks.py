@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.checks import Error, Warning
+from django.core.exceptions import ImproperlyConfigured
+
+
+def check_pdf_field_map(app_configs, **kwargs):
+    """
+    Loads the J101E template at startup and reports any field in
+    pdf_map.py that it does not contain.
+    """
+    from .pdf_fill import PDF_ENGINES, TEMPLATE_PATH, get_template
+
+    errors = []
+    if settings.PDF_ENGINE not in PDF_ENGINES:
+        errors.append(Error(
+            f"PDF_ENGINE is {settings.PDF_ENGINE!r}; expected one of {', '.join(PDF_ENGINES)}.",
+            id='maintain.E003',
+        ))
+
+    try:
+        get_template()
+    except OSError as e:
+        errors.append(Error(f"Could not read the J101E template at {TEMPLATE_PATH}: {e}", id='maintain.E001'))
+    except ImproperlyConfigured as e:
+        errors.append(Error(str(e), hint="Update maintain/pdf_map.py to match the PDF.", id='maintain.E002'))
+    return errors
+
+
+def check_profiler(app_configs, **kwargs):
+    from .profiling import PROFILERS
+
+    if settings.PROFILER not in PROFILERS:
+        return [Error(
+            f"PROFILER is {settings.PROFILER!r}; expected one of {', '.join(PROFILERS)}.",
+            id='maintain.E004',
+        )]
+    return []
+
+
+def check_render_pool(app_configs, **kwargs):
+    if settings.PDF_RENDER_WORKERS < settings.PDF_RENDER_CONCURRENCY:
+        return [Warning(
+            f"PDF_RENDER_WORKERS ({settings.PDF_RENDER_WORKERS}) is below PDF_RENDER_CONCURRENCY "
+            f"({settings.PDF_RENDER_CONCURRENCY}), so admitted renders can wait for a render thread.",
+            id='maintain.W001',
+        )]
+    return []
@@ -0,0 +1,267 @@
+# maintain/claim_data.py
+
+"""
+Typed, slotted records of a claim's answers.
+
+There is one record class per wizard step, generated from the step's
+form so the two cannot drift apart. Each declared field becomes a slot,
+and values keep their form types (str, date, Decimal, int), so the
+views, the CSV export and the PDF payload use them as they are instead
+of re-parsing strings.
+
+Records are stored as compact JSON. Only fields that hold a value are
+written, with dates and Decimals as strings. Decoding restores each
+value's type from the record's declaration. Older stored answers
+(plain {field: string} dictionaries) decode the same way.
+"""
+
+import hashlib
+import json
+from datetime import date
+from decimal import Decimal
+
+from django import forms as django_forms
+
+from . import forms
+
+# Hidden form fields that are wizard plumbing, not answers.
+IGNORED_FIELDS = {'form_step'}
+
+# The Python type of each kind of form field; any other field holds a str.
+FIELD_TYPES = (
+    (django_forms.DecimalField, Decimal),
+    (django_forms.DateField, date),
+    (django_forms.IntegerField, int),
+    (django_forms.BooleanField, bool),
+)
+
+PARSERS = {
+    str: str,
+    Decimal: lambda value: Decimal(str(value)),
+    date: lambda value: value if isinstance(value, date) else date.fromisoformat(value),
+    int: int,
+    bool: bool,
+}
+
+
+def encode_value(value):
+    if isinstance(value, (date, Decimal)):
+        return str(value)
+    return value
+
+
+def content_hash(encoded):
+    """
+    Identifies a step's answers by a hash of their JSON form.
+    """
+    data = json.dumps(encoded, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class Record:
+    """
+    Base class for the step records. FIELDS is a tuple of (name, type)
+    pairs, and __slots__ holds the same names in the same order.
+    FORM_CLASS is the form the record was generated from.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+    FORM_CLASS = None
+
+    def __init__(self, **values):
+        for name, _ in self.FIELDS:
+            setattr(self, name, values.get(name))
+
+    @classmethod
+    def from_cleaned_data(cls, cleaned_data):
+        """
+        Builds a record from a form's cleaned_data, whose values are already typed.
+        """
+        return cls(**{
+            name: cleaned_data.get(name)
+            for name, _ in cls.FIELDS
+            if cleaned_data.get(name) not in (None, '')
+        })
+
+    @classmethod
+    def decode(cls, data):
+        """
+        Builds a record from its JSON form ({name: value}), restoring each value's type.
+        """
+        values = {}
+        for name, kind in cls.FIELDS:
+            value = data.get(name)
+            if value not in (None, ''):
+                values[name] = PARSERS[kind](value)
+        return cls(**values)
+
+    def encode(self):
+        """
+        Returns the record's JSON form, leaving out fields with no value.
+        """
+        return {
+            name: encode_value(value)
+            for name, value in self.items()
+            if value is not None
+        }
+
+    def replace(self, **changes):
+        """
+        Returns a copy of the record with `changes` applied; an empty value clears its field.
+        """
+        values = self.as_dict()
+        values.update(changes)
+        return type(self)(**{name: value for name, value in values.items() if value not in (None, '')})
+
+    def items(self):
+        """
+        Yields (name, value) for every field, in the form's order.
+        """
+        for name, _ in self.FIELDS:
+            yield name, getattr(self, name)
+
+    def as_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name, _ in self.FIELDS
+        )
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={value!r}' for name, value in self.items() if value is not None)
+        return f'{type(self).__name__}({values})'
+
+
+def record_class(name, form_class):
+    """
+    Creates the Record subclass for form_class, with a slot per answer field.
+    """
+    fields = []
+    for field_name, field in form_class.base_fields.items():
+        if field_name in IGNORED_FIELDS:
+            continue
+        kind = next((kind for field_type, kind in FIELD_TYPES if isinstance(field, field_type)), str)
+        fields.append((field_name, kind))
+    return type(name, (Record,), {
+        '__slots__': tuple(field_name for field_name, _ in fields),
+        'FIELDS': tuple(fields),
+        'FORM_CLASS': form_class,
+        '__module__': __name__,
+    })
+
+
+ApplicantDetails = record_class('ApplicantDetails', forms.ApplicantDetailsForm)
+RespondentDetails = record_class('RespondentDetails', forms.RespondentDetailsForm)
+ChildDetails = record_class('ChildDetails', forms.ChildForm)
+ApplicantIncomeAssets = record_class('ApplicantIncomeAssets', forms.ApplicantIncomeAssetsForm)
+Financials = record_class('Financials', forms.FinancialsForm)
+
+
+class ClaimData:
+    """
+    All of a claim's answers: one record per completed step (a list of
+    records for child_details), or None for a step not yet completed.
+
+    `memo` is the bookkeeping stored alongside the answers of a saved
+    claim (see claims.py); it is empty for answers from anywhere else.
+    """
+
+    # Step name -> record class, in wizard order.
+    STEPS = {
+        'applicant_details': ApplicantDetails,
+        'respondent_details': RespondentDetails,
+        'child_details': ChildDetails,
+        'applicant_income_assets': ApplicantIncomeAssets,
+        'financials': Financials,
+    }
+    # Steps answered with a formset, which hold a list of records.
+    LIST_STEPS = {'child_details'}
+
+    __slots__ = tuple(STEPS) + ('memo',)
+
+    def __init__(self, memo=None, **steps):
+        self.memo = memo or {}
+        for step_name in self.STEPS:
+            setattr(self, step_name, steps.get(step_name))
+
+    @classmethod
+    def build_step(cls, step_name, cleaned_data):
+        """
+        Returns the value for a step from its form (or formset) cleaned_data.
+        """
+        record_cls = cls.STEPS[step_name]
+        if step_name in cls.LIST_STEPS:
+            return [record_cls.from_cleaned_data(item) for item in cleaned_data]
+        return record_cls.from_cleaned_data(cleaned_data)
+
+    @classmethod
+    def decode_step(cls, step_name, data):
+        if data is None:
+            return None
+        record_cls = cls.STEPS[step_name]
+        if step_name in cls.LIST_STEPS:
+            return [record_cls.decode(item) for item in data if isinstance(item, dict)]
+        return record_cls.decode(data)
+
+    @classmethod
+    def encode_step(cls, step_name, value):
+        if value is None:
+            return None
+        if step_name in cls.LIST_STEPS:
+            return [record.encode() for record in value]
+        return value.encode()
+
+    @classmethod
+    def from_wizard_data(cls, wizard_data):
+        """
+        Builds a ClaimData from a {step_name: answers} dictionary in JSON
+        form, such as a bulk export record or an old session.
+        """
+        return cls(**{
+            step_name: cls.decode_step(step_name, wizard_data.get(step_name))
+            for step_name in cls.STEPS
+        })
+
+    def step_hash(self, step_name):
+        """
+        content_hash() of one step's answers (None if it has none).
+        """
+        value = getattr(self, step_name)
+        return None if value is None else content_hash(self.encode_step(step_name, value))
+
+    def to_wizard_data(self):
+        """
+        Returns the {step_name: answers} JSON form of the completed steps.
+        """
+        return {step_name: self.encode_step(step_name, value) for step_name, value in self.items()}
+
+    def items(self):
+        """
+        Yields (step_name, value) for each completed step, in wizard order.
+        """
+        for step_name in self.STEPS:
+            value = getattr(self, step_name)
+            if value is not None:
+                yield step_name, value
+
+    def completed_steps(self):
+        return [step_name for step_name, _ in self.items()]
+
+    def initial(self, step_name):
+        """
+        Returns a step's answers as initial data for its form or formset.
+        """
+        value = getattr(self, step_name)
+        if value is None:
+            return {}
+        if step_name in self.LIST_STEPS:
+            return [record.as_dict() for record in value]
+        return value.as_dict()
+
+    def __bool__(self):
+        return any(getattr(self, step_name) is not None for step_name in self.STEPS)
+
+    def __repr__(self):
+        return f'ClaimData({", ".join(self.completed_steps())})'
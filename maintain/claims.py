@@ -0,0 +1,321 @@
+# maintain/claims.py
+
+"""
+Connects a visitor's session to their Claim.
+
+The session holds only the claim's token; the answers themselves live in
+the Claim row, one column per step, so a step save never rewrites the
+session or the steps that did not change. The functions whose names
+start with 'a' (aload_claim_data, asave_step...) are the versions for
+async views.
+
+Each claim also keeps a memo (Claim.memo):
+
+    {'steps': {step_name: {'hash': ..., 'errors': ...}},
+     'derived': {'key': ..., 'values': ...}}
+
+A step's 'errors' are those its whole form reported for the answers
+with that content hash: [] once they pass (as they do when the step is
+submitted), or None if they have not been checked (after an autosave).
+validate_steps() therefore only re-validates steps whose answers
+changed. Autosaved answers are stored like submitted ones, so anything
+that relies on a step being complete (the wizard's navigation, the PDF)
+goes by validated_steps(), not by which steps have answers.
+
+'derived' holds derived.DerivedValues for the answers and date in 'key'.
+Everything in the memo is checked against the current answers before
+use, so a memo overwritten by a concurrent request only costs a
+recomputation, never a stale result.
+"""
+
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.forms import formset_factory
+
+from . import derived, timing
+from .claim_data import ClaimData
+from .models import Claim, new_token
+
+SESSION_KEY = 'claim_token'
+
+# Answers were once kept in the session itself under this key.
+LEGACY_SESSION_KEY = 'wizard_data'
+
+
+def get_token(request, create=False):
+    token = request.session.get(SESSION_KEY)
+    if token is None and create:
+        token = new_token()
+        request.session[SESSION_KEY] = token
+    return token
+
+
+async def aget_token(request, create=False):
+    token = await request.session.aget(SESSION_KEY)
+    if token is None and create:
+        token = new_token()
+        await request.session.aset(SESSION_KEY, token)
+    return token
+
+
+def load_claim_data(request):
+    """
+    Returns the visitor's answers as a ClaimData (empty if there are none).
+    """
+    if LEGACY_SESSION_KEY in request.session:
+        replace_claim_data(request, ClaimData.from_wizard_data(request.session.pop(LEGACY_SESSION_KEY)))
+
+    token = get_token(request)
+    with timing.span('claim-load'):
+        claim = Claim.objects.filter(token=token).only(*Claim.STEPS, 'memo').first() if token else None
+    return claim.claim_data if claim else ClaimData()
+
+
+async def aload_claim_data(request):
+    if await request.session.ahas_key(LEGACY_SESSION_KEY):
+        # A one-off conversion, so it is left to the sync version.
+        return await sync_to_async(load_claim_data)(request)
+
+    token = await aget_token(request)
+    with timing.span('claim-load'):
+        claim = await Claim.objects.filter(token=token).only(*Claim.STEPS, 'memo').afirst() if token else None
+    return claim.claim_data if claim else ClaimData()
+
+
+def step_state(claim_data, step_name, errors):
+    """
+    Returns claim_data.memo with the state of one step (as it now is in
+    `claim_data`) set to `errors`.
+    """
+    steps = dict(claim_data.memo.get('steps', {}))
+    steps[step_name] = {'hash': claim_data.step_hash(step_name), 'errors': errors}
+    return dict(claim_data.memo, steps=steps)
+
+
+def save_memo(request, claim_data, memo):
+    if memo == claim_data.memo:
+        return
+    claim_data.memo = memo
+    token = get_token(request)
+    if token:
+        Claim.objects.filter(token=token).update(memo=memo)
+
+
+async def asave_memo(request, claim_data, memo):
+    if memo == claim_data.memo:
+        return
+    claim_data.memo = memo
+    token = await aget_token(request)
+    if token:
+        await Claim.objects.filter(token=token).aupdate(memo=memo)
+
+
+def apply_step(claim_data, step_name, cleaned_data):
+    """
+    Sets one step of `claim_data` from its form's cleaned_data, marked as
+    validated. Returns the step's encoded answers to store, or None if
+    neither they nor the memo changed.
+    """
+    value = ClaimData.build_step(step_name, cleaned_data)
+    unchanged = getattr(claim_data, step_name) == value
+
+    setattr(claim_data, step_name, value)
+    memo = step_state(claim_data, step_name, [])
+    if unchanged and memo == claim_data.memo:
+        return None
+    claim_data.memo = memo
+    return ClaimData.encode_step(step_name, value)
+
+
+def save_step(request, step_name, cleaned_data, claim_data=None):
+    """
+    Saves one step's answers from its form's cleaned_data (so they are
+    marked as validated), skipping the write entirely if nothing changed.
+    Pass the already loaded `claim_data` to save a query (it is updated
+    in place).
+    """
+    if claim_data is None:
+        claim_data = load_claim_data(request)
+    encoded = apply_step(claim_data, step_name, cleaned_data)
+    if encoded is not None:
+        Claim.save_step(get_token(request, create=True), step_name, encoded, claim_data.memo)
+
+
+async def asave_step(request, step_name, cleaned_data, claim_data=None):
+    if claim_data is None:
+        claim_data = await aload_claim_data(request)
+    encoded = apply_step(claim_data, step_name, cleaned_data)
+    if encoded is not None:
+        await Claim.asave_step(await aget_token(request, create=True), step_name, encoded, claim_data.memo)
+
+
+def patch_step(request, step_name, changes, claim_data):
+    """
+    Merges already cleaned `changes` into one step's stored answers and
+    saves the step if anything changed. `changes` is {field: value}, or
+    {index: {field: value}} for a list step such as child_details. The
+    step is saved even if it was never submitted, so partially filled
+    steps survive a lost connection. `claim_data` is updated in place.
+    Returns True if the claim was written.
+    """
+    record_cls = ClaimData.STEPS[step_name]
+    current = getattr(claim_data, step_name)
+    if step_name in ClaimData.LIST_STEPS:
+        base = current or []
+        value = list(base)
+        for index, fields in sorted(changes.items()):
+            # A patch can add the next record, never leave a gap of blank ones.
+            if index > len(value):
+                raise ValueError(f"{step_name} has {len(value)} records; can't patch record {index}.")
+            if index == len(value):
+                value.append(record_cls())
+            value[index] = value[index].replace(**fields)
+        if not any(record.encode() for record in value[len(base):]):
+            # Only blank records were added.
+            value = value[:len(base)]
+    else:
+        base = current or record_cls()
+        value = base.replace(**changes)
+
+    # Comparing against the blank `base` means clearing a field of a step
+    # that was never saved does not create it.
+    if value == base:
+        return False
+    setattr(claim_data, step_name, value)
+    # Only these fields were checked, so the step as a whole is not validated.
+    claim_data.memo = step_state(claim_data, step_name, None)
+    Claim.save_step(get_token(request, create=True), step_name, ClaimData.encode_step(step_name, value), claim_data.memo)
+    return True
+
+
+def replace_claim_data(request, claim_data):
+    """
+    Replaces the visitor's answers with `claim_data` as a whole.
+    They are not validated until validate_steps() checks them.
+    """
+    token = get_token(request, create=True)
+    steps = {
+        step_name: ClaimData.encode_step(step_name, getattr(claim_data, step_name))
+        for step_name in Claim.STEPS
+    }
+    Claim.objects.update_or_create(token=token, defaults=dict(steps, memo={}))
+
+
+def bound_step_form(step_name, claim_data):
+    """
+    Returns the step's form (or formset) bound to its stored answers, as
+    though they had just been submitted.
+    """
+    encoded = ClaimData.encode_step(step_name, getattr(claim_data, step_name))
+    form_class = ClaimData.STEPS[step_name].FORM_CLASS
+    if step_name in ClaimData.LIST_STEPS:
+        data = {f'{step_name}-TOTAL_FORMS': len(encoded), f'{step_name}-INITIAL_FORMS': 0}
+        for index, item in enumerate(encoded):
+            data.update({f'{step_name}-{index}-{name}': value for name, value in item.items()})
+        return formset_factory(form_class, extra=0)(data, prefix=step_name)
+
+    data = dict(encoded, form_step=step_name)
+    if step_name == 'respondent_details':
+        applicant = claim_data.applicant_details
+        return form_class(data, applicant_id=applicant.id_number if applicant else None)
+    return form_class(data)
+
+
+def error_messages(form):
+    """
+    Flattens a bound form's (or formset's) errors into a list of messages.
+    """
+    if hasattr(form, 'management_form'):
+        messages = list(form.non_form_errors())
+        for number, item_form in enumerate(form.forms, start=1):
+            messages += [f"Child {number}: {message}" for message in error_messages(item_form)]
+        return messages
+
+    messages = []
+    for name, errors in form.errors.items():
+        label = form.fields[name].label if name in form.fields else None
+        messages += [f"{label} — {message}" if label else message for message in errors]
+    return messages
+
+
+def validated_steps(claim_data):
+    """
+    The steps, in wizard order, whose current answers have passed their
+    whole form (when submitted, or in validate_steps()).
+    """
+    steps = claim_data.memo.get('steps', {})
+    return [
+        step_name for step_name, _ in claim_data.items()
+        if steps.get(step_name, {}).get('hash') == claim_data.step_hash(step_name)
+        and steps[step_name]['errors'] == []
+    ]
+
+
+def validate_steps(request, claim_data):
+    """
+    Runs each stored step's whole form over its answers, except for steps
+    already validated with the same content. Returns {step_name: [error
+    messages]} for the steps that do not pass.
+    """
+    steps = dict(claim_data.memo.get('steps', {}))
+    invalid = {}
+    for step_name, _ in claim_data.items():
+        step_hash = claim_data.step_hash(step_name)
+        state = steps.get(step_name)
+        if state is None or state['hash'] != step_hash or state['errors'] is None:
+            form = bound_step_form(step_name, claim_data)
+            state = steps[step_name] = {
+                'hash': step_hash,
+                'errors': [] if form.is_valid() else error_messages(form),
+            }
+        if state['errors']:
+            invalid[step_name] = state['errors']
+    save_memo(request, claim_data, dict(claim_data.memo, steps=steps))
+    return invalid
+
+
+async def avalidate_steps(request, claim_data):
+    # Validation is CPU-bound form code and save_memo() is sync.
+    return await sync_to_async(validate_steps)(request, claim_data)
+
+
+def memo_derived_values(claim_data, today):
+    """
+    Returns (values, memo): the claim's derived.DerivedValues as at
+    `today`, and the memo to save if they were not already in it.
+    """
+    key = ':'.join([today.isoformat()] + [claim_data.step_hash(step_name) or '-' for step_name in derived.STEPS])
+    memo = claim_data.memo.get('derived')
+    if memo and memo['key'] == key:
+        return derived.DerivedValues.decode(memo['values']), claim_data.memo
+
+    values = derived.compute(claim_data, today)
+    return values, dict(claim_data.memo, derived={'key': key, 'values': values.encode()})
+
+
+def derived_values(request, claim_data, today=None):
+    """
+    Returns the claim's derived.DerivedValues as at `today` (default: the
+    current date), from the memo if the answers they depend on are unchanged.
+    """
+    values, memo = memo_derived_values(claim_data, today or date.today())
+    save_memo(request, claim_data, memo)
+    return values
+
+
+async def aderived_values(request, claim_data, today=None):
+    values, memo = memo_derived_values(claim_data, today or date.today())
+    await asave_memo(request, claim_data, memo)
+    return values
+
+
+def resume(request, token):
+    """
+    Attaches the draft with the given token to this session.
+    Returns False if there is no such draft.
+    """
+    if not Claim.objects.filter(token=token).exists():
+        return False
+    request.session[SESSION_KEY] = token
+    return True
@@ -0,0 +1,134 @@
+# maintain/csv_export.py
+
+"""
+CSV exports of the wizard answers. Everything here is a generator, so
+exports can be streamed with StreamingHttpResponse without building the
+file in memory.
+
+Two layouts are offered:
+
+long   One row per answer: Section, Question, Answer. This is the
+       applicant's own "Download My Information" file.
+wide   One row per claim and one column per form field, in the order the
+       fields are declared in views.WIZARD_FORMS. This layout is for
+       reporting across many claims.
+"""
+
+import csv
+
+from .claim_data import IGNORED_FIELDS
+from .models import Claim
+from .pdf_map import PDF_CHILD_MAP
+
+# The wide layout has a fixed set of columns for each child, one set per
+# child slot on the J101.
+MAX_CHILDREN = len(PDF_CHILD_MAP)
+
+
+class Echo:
+    """
+    A file-like object whose write() just returns the CSV writer's output.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    """
+    Encodes rows as CSV, one UTF-8 chunk per row.
+    """
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row).encode('utf-8')
+
+
+# A helper function to make section titles more readable
+def format_title(title):
+    return title.replace('_', ' ').title()
+
+
+def format_answer(value):
+    return '' if value is None else str(value)
+
+
+def summary_csv_rows(claim_data):
+    """
+    Yields the rows of the long CSV summary of a ClaimData, header first.
+    """
+    yield ['Section', 'Question', 'Answer']
+
+    # Iterate through all the steps that have been completed
+    for step_name, step_data in claim_data.items():
+
+        # Handle formsets like 'child_details' which are lists of records
+        if isinstance(step_data, list):
+            for i, record in enumerate(step_data):
+                # e.g., "Child Details 1", "Child Details 2"
+                item_title = f"{format_title(step_name)} {i + 1}"
+                for question, answer in record.items():
+                    yield [item_title, question, format_answer(answer)]
+
+        # Handle regular form data, which is a single record
+        else:
+            section_title = format_title(step_name)
+            for question, answer in step_data.items():
+                yield [section_title, question, format_answer(answer)]
+
+
+def wide_columns(wizard_forms, max_children=MAX_CHILDREN):
+    """
+    Returns the wide layout's columns as (step_name, index, field_name)
+    tuples, taken from the forms' declared answer fields. index is the item's
+    position for a formset step, and None otherwise.
+    """
+    columns = []
+    for step_name, form_class in wizard_forms.items():
+        # A formset class carries the class of its forms as `form`.
+        if hasattr(form_class, 'form'):
+            field_names = [name for name in form_class.form.base_fields if name not in IGNORED_FIELDS]
+            for i in range(max_children):
+                columns += [(step_name, i, field_name) for field_name in field_names]
+        else:
+            columns += [
+                (step_name, None, field_name)
+                for field_name in form_class.base_fields
+                if field_name not in IGNORED_FIELDS
+            ]
+    return columns
+
+
+def wide_header(columns):
+    return [
+        f'{step_name}.{field_name}' if index is None else f'{step_name}.{index + 1}.{field_name}'
+        for step_name, index, field_name in columns
+    ]
+
+
+def wide_row(claim_data, columns):
+    row = []
+    for step_name, index, field_name in columns:
+        record = getattr(claim_data, step_name)
+        if index is not None:
+            record = record[index] if record is not None and index < len(record) else None
+        row.append(format_answer(getattr(record, field_name, None)))
+    return row
+
+
+def wide_csv_rows(claims, columns):
+    """
+    Yields the header and then one row per claim (a ClaimData).
+    `claims` may be any iterable, including a lazy one.
+    """
+    yield wide_header(columns)
+    for claim_data in claims:
+        yield wide_row(claim_data, columns)
+
+
+def stored_claims(chunk_size=500):
+    """
+    Yields the ClaimData of every stored claim, fetching claims from
+    the database `chunk_size` at a time.
+    """
+    for claim in Claim.objects.only(*Claim.STEPS).order_by('pk').iterator(chunk_size=chunk_size):
+        yield claim.claim_data
@@ -0,0 +1,95 @@
+# maintain/derived.py
+
+"""
+Values worked out from a claim's answers rather than entered: dates of
+birth from ID numbers, ages, income and expense totals and the amount
+claimed per child.
+
+They are computed by compute() and kept in the claim's memo (see
+claims.derived_values), so the summary page, the PDF and the bundle
+reuse them until an answer they depend on, or the date, changes.
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from . import utils
+from .claim_data import ApplicantDetails, ApplicantIncomeAssets, Financials, Record, RespondentDetails
+from .schema import EXPENSE_PDF_ROWS
+
+ZERO = Decimal('0.00')
+
+# The steps the derived values depend on.
+STEPS = ('applicant_details', 'respondent_details', 'child_details', 'applicant_income_assets', 'financials')
+
+
+class DerivedValues(Record):
+    FIELDS = (
+        ('applicant_dob', date),
+        ('applicant_age', str),
+        ('respondent_dob', date),
+        ('respondent_age', str),
+        ('nett_salary', Decimal),
+        ('total_income', Decimal),
+        ('amount_per_child', Decimal),
+        ('total_self_expenditure', Decimal),
+        ('total_child_expenditure', Decimal),
+    )
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+
+def get_decimal(record, name):
+    return getattr(record, name, None) or ZERO
+
+
+def resolve_dob(person):
+    """
+    Date of birth from the ID number if it holds one, else from the
+    date_of_birth answer. Returns None if neither is usable.
+    """
+    return utils.extract_dob_from_id(person.id_number) or getattr(person, 'date_of_birth', None)
+
+
+def compute(claim_data, today):
+    """
+    Works out the derived values of a ClaimData, with ages as at `today`.
+    """
+    # A step not yet completed reads as a record with no answers.
+    applicant = claim_data.applicant_details or ApplicantDetails()
+    respondent = claim_data.respondent_details or RespondentDetails()
+    children = claim_data.child_details or []
+    income_assets = claim_data.applicant_income_assets or ApplicantIncomeAssets()
+    financials = claim_data.financials or Financials()
+
+    total_deductions = sum([
+        get_decimal(income_assets, 'tax'),
+        get_decimal(income_assets, 'medical_aid'),
+        get_decimal(income_assets, 'pension'),
+        get_decimal(income_assets, 'other_deductions')
+    ])
+    nett_salary = get_decimal(income_assets, 'gross_salary') - total_deductions
+
+    total_maintenance_claimed = get_decimal(financials, 'total_maintenance_claimed')
+
+    total_self_expenditure = ZERO
+    total_child_expenditure = ZERO
+    for self_field, child_field, *_ in EXPENSE_PDF_ROWS:
+        if self_field:
+            total_self_expenditure += get_decimal(financials, self_field)
+        total_child_expenditure += get_decimal(financials, child_field)
+
+    applicant_dob = resolve_dob(applicant)
+    respondent_dob = resolve_dob(respondent)
+    # An unknown age is None rather than calculate_age's '', as it is
+    # once the values have been through the memo.
+    return DerivedValues(
+        applicant_dob=applicant_dob,
+        applicant_age=utils.calculate_age(applicant_dob, today) or None,
+        respondent_dob=respondent_dob,
+        respondent_age=utils.calculate_age(respondent_dob, today) or None,
+        nett_salary=nett_salary,
+        total_income=nett_salary + get_decimal(income_assets, 'other_income_1'),
+        amount_per_child=total_maintenance_claimed / len(children) if children else ZERO,
+        total_self_expenditure=total_self_expenditure,
+        total_child_expenditure=total_child_expenditure,
+    )
@@ -0,0 +1,97 @@
+# maintain/form_rendering.py
+
+"""
+A form renderer that renders each text-like widget's markup only once.
+
+Rendering the wizard's steps is dominated by widgets (the financials step
+has over 40), and each one runs through Django's widget templates on
+every request even though almost all of its HTML (name, id, CSS classes,
+placeholder, step, required...) is the same for every user. Only the
+value differs.
+
+So the first time a widget is rendered with a given name and attributes,
+it is rendered once with a marker in place of its value, and the
+markup on either side of the marker is kept. Later renders just join
+those two halves around the escaped value. Errors are unaffected: they
+are rendered by the step templates, and a field with errors (which gets
+aria-invalid) has different attributes and so its own skeleton.
+
+Skeletons live in this process, so a changed form definition starts
+with an empty cache when the new code is deployed.
+"""
+
+from django.forms.renderers import DjangoTemplates
+from django.utils.html import conditional_escape
+
+# Widgets whose template outputs the value once, escaped, and nothing else
+# that depends on it. Choice widgets and checkboxes are rendered as usual.
+SKELETON_TEMPLATES = frozenset([
+    'django/forms/widgets/text.html',
+    'django/forms/widgets/number.html',
+    'django/forms/widgets/email.html',
+    'django/forms/widgets/url.html',
+    'django/forms/widgets/tel.html',
+    'django/forms/widgets/date.html',
+    'django/forms/widgets/hidden.html',
+    'django/forms/widgets/textarea.html',
+])
+
+# Stands in for the value while a skeleton is rendered. The private-use
+# characters cannot occur in the widget's own markup, and escaping leaves
+# them as they are.
+VALUE_MARKER = '\ue000value\ue000'
+
+# Formset steps can name many fields, so stop adding skeletons past this.
+MAX_SKELETONS = 4096
+
+
+class SkeletonRenderer(DjangoTemplates):
+    def __init__(self):
+        super().__init__()
+        # {skeleton key: (markup before the value, markup after it)}
+        self.skeletons = {}
+
+    def render(self, template_name, context, request=None):
+        if template_name not in SKELETON_TEMPLATES or context.keys() != {'widget'}:
+            return super().render(template_name, context, request)
+
+        widget = context['widget']
+        value = widget['value']
+        try:
+            key = skeleton_key(template_name, widget)
+        except TypeError:
+            # An unhashable attribute value; this widget can't be keyed.
+            return super().render(template_name, context, request)
+
+        skeleton = self.skeletons.get(key)
+        if skeleton is None:
+            if value is None:
+                # With no value the template leaves the value out altogether.
+                markup = super().render(template_name, context, request)
+                skeleton = (markup, None)
+            else:
+                marked = dict(context, widget=dict(widget, value=VALUE_MARKER))
+                head, _, tail = super().render(template_name, marked, request).partition(VALUE_MARKER)
+                skeleton = (head, tail)
+            if len(self.skeletons) < MAX_SKELETONS:
+                self.skeletons[key] = skeleton
+
+        head, tail = skeleton
+        if tail is None:
+            return head
+        return f'{head}{conditional_escape(value)}{tail}'
+
+
+def skeleton_key(template_name, widget):
+    """
+    Everything the widget's markup depends on apart from the value itself,
+    plus whether there is a value at all.
+    """
+    return (
+        template_name,
+        widget['name'],
+        widget.get('type'),
+        widget['required'],
+        widget['value'] is None,
+        frozenset(widget['attrs'].items()),
+    )
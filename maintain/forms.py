@@ -1,6 +1,7 @@
 from django import forms
 from django.forms import formset_factory
 from datetime import date
+from .schema import EXPENSE_GROUPS, EXPENSES
 from .utils import extract_dob_from_id
 
 class ApplicantDetailsForm(forms.Form):
@@ -182,43 +183,8 @@ class FinancialsForm(forms.Form):
     payment_made_to = forms.CharField(label="Who should the payment be made to?", widget=forms.TextInput(attrs=text_input_attrs), required=False, help_text="e.g., Your bank account details.")
     other_contributions_text = forms.CharField(label="Other requested contributions?", widget=forms.Textarea(attrs=text_area_attrs), required=False, help_text="e.g., '50% of school fees and uncovered medical expenses.'")
     
-    # EXPENSE FIELDS
-    self_lodging = forms.DecimalField(label="Your Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_lodging = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_groceries = forms.DecimalField(label="Your Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_groceries = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_utilities = forms.DecimalField(label="Your Share (Water/Elec)", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_utilities = forms.DecimalField(label="Child(ren)'s Share (Water/Elec)", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_rates_taxes = forms.DecimalField(label="Your Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_rates_taxes = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_laundry = forms.DecimalField(label="Your Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_laundry = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_telephone = forms.DecimalField(label="Your Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_telephone = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_clothing = forms.DecimalField(label="Your Share (Clothes/Shoes)", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_clothing = forms.DecimalField(label="Child(ren)'s Share (Clothes/Shoes)", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_school_uniforms = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_sports_clothes = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_transport_public = forms.DecimalField(label="Your Share (Bus/Taxi)", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_transport_public = forms.DecimalField(label="Child(ren)'s Share (Bus/Taxi)", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_car_fuel = forms.DecimalField(label="Your Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_car_fuel = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_car_maintenance = forms.DecimalField(label="Your Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_car_maintenance = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_car_insurance = forms.DecimalField(label="Your Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_car_insurance = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_school_fees = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_stationery = forms.DecimalField(label="Child(ren)'s Share (Books/Stationery)", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_extramural = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_medical_uncovered = forms.DecimalField(label="Your Share (Doctor/Dentist)", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_medical_uncovered = forms.DecimalField(label="Child(ren)'s Share (Doctor/Dentist)", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_medication_uncovered = forms.DecimalField(label="Your Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_medication_uncovered = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_entertainment = forms.DecimalField(label="Your Share (Holidays/Entertainment)", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_entertainment = forms.DecimalField(label="Child(ren)'s Share (Holidays/Entertainment)", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    self_other = forms.DecimalField(label="Your Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    child_other = forms.DecimalField(label="Child(ren)'s Share", required=False, decimal_places=2, widget=forms.NumberInput(attrs=currency_attrs))
-    
+    # EXPENSE FIELDS are generated from schema.EXPENSES below, ahead of the final claim.
+
     # FINAL CLAIM
     total_maintenance_claimed = forms.DecimalField(
         label="Total Monthly Maintenance You Are Claiming (R)",
@@ -227,4 +193,38 @@ class FinancialsForm(forms.Form):
         help_text="Based on the expenses above, enter the total amount you are asking the other parent to contribute.",
         widget=forms.NumberInput(attrs=currency_attrs)
     )
-    form_step = forms.CharField(widget=forms.HiddenInput(), initial='financials')
\ No newline at end of file
+    form_step = forms.CharField(widget=forms.HiddenInput(), initial='financials')
+
+    def expense_groups(self):
+        """
+        Returns [(group, [(label, self bound field or None, child bound field), ...]), ...]
+        for the expense table, in schema order.
+        """
+        return [
+            (group, [
+                (expense.label, self[expense.self_field] if expense.self_field else None, self[expense.child_field])
+                for expense in expenses
+            ])
+            for group, expenses in EXPENSE_GROUPS
+        ]
+
+
+def add_expense_fields(form_class, before):
+    """
+    Adds an amount field for every share of every schema.EXPENSES category
+    to form_class, placed ahead of the field named `before`.
+    """
+    expense_fields = {
+        field_name: forms.DecimalField(label=label, required=False, decimal_places=2, widget=forms.NumberInput(attrs=form_class.currency_attrs))
+        for expense in EXPENSES
+        for field_name, label in expense.share_labels()
+    }
+    fields = {}
+    for name, field in form_class.base_fields.items():
+        if name == before:
+            fields.update(expense_fields)
+        fields[name] = field
+    form_class.base_fields = form_class.declared_fields = fields
+
+
+add_expense_fields(FinancialsForm, before='total_maintenance_claimed')
@@ -0,0 +1,130 @@
+import io
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.utils import get_app_template_dirs
+from fontTools import subset
+from fontTools.ttLib import TTFont
+
+FONT_DIR = settings.BASE_DIR / 'static' / 'fonts'
+CSS_PATH = settings.BASE_DIR / 'static' / 'css' / 'fonts.css'
+
+# (family, weight, file) for the text faces, all in static/fonts.
+TEXT_FACES = [
+    ('Public Sans', 400, 'public-sans-v20-latin-regular.woff2'),
+    ('Public Sans', 700, 'public-sans-v20-latin-700.woff2'),
+    ('Noto Sans', 400, 'noto-sans-v39-latin-regular.woff2'),
+    ('Noto Sans', 500, 'noto-sans-v39-latin-500.woff2'),
+    ('Noto Sans', 700, 'noto-sans-v39-latin-700.woff2'),
+]
+
+ICON_FAMILY = 'Material Symbols Outlined'
+ICON_SOURCE = 'material-symbols-outlined-v266-latin-regular.woff2'
+ICON_SUBSET = 'material-symbols-outlined-subset.woff2'
+
+# The text of an icon element, e.g. <span class="material-icons">info</span>.
+ICON_RE = re.compile(r'class="[^"]*\bmaterial-(?:icons|symbols-outlined)\b[^"]*"[^>]*>\s*([a-z0-9_]+)\s*<')
+
+FONT_FACE = """@font-face {{
+    font-family: '{family}';
+    font-style: normal;
+    font-weight: {weight};
+    src: url('../fonts/{file}') format('woff2');
+    font-display: {display};
+}}
+"""
+
+
+def template_icon_names():
+    """
+    The icon names used by the project's templates, sorted.
+    """
+    dirs = [dir_ for engine in settings.TEMPLATES for dir_ in engine['DIRS']]
+    dirs += get_app_template_dirs('templates')
+    names = set()
+    for dir_ in dirs:
+        for path in dir_.rglob('*.html'):
+            names.update(ICON_RE.findall(path.read_text(encoding='utf-8')))
+    return sorted(names)
+
+
+def subset_icon_font(source, names):
+    """
+    Returns the woff2 bytes of `source` cut down to the glyphs of the icons
+    `names`. Raises CommandError if the font has no icon for a name.
+    """
+    font = TTFont(source)
+    cmap = font.getBestCmap()
+    ligature_sets = [
+        # Material Symbols keeps its icon ligatures in extension subtables.
+        getattr(subtable, 'ExtSubTable', subtable).ligatures
+        for lookup in font['GSUB'].table.LookupList.Lookup
+        for subtable in lookup.SubTable
+        if getattr(subtable, 'ExtSubTable', subtable).LookupType == 4
+    ]
+
+    def icon_glyph(name):
+        glyphs = [cmap.get(ord(char)) for char in name]
+        for ligatures in ligature_sets:
+            for ligature in ligatures.get(glyphs[0], ()):
+                if ligature.Component == glyphs[1:]:
+                    return ligature.LigGlyph
+        return None
+
+    icons = {name: icon_glyph(name) for name in names}
+    missing = [name for name, glyph in icons.items() if glyph is None]
+    if missing:
+        raise CommandError(f"{source.name} has no icon named {', '.join(missing)}.")
+
+    # The subsetter keeps every ligature whose letters are kept, and the
+    # icon names between them use most of the alphabet, so first drop the
+    # ligatures for icons that aren't used.
+    keep = set(icons.values())
+    for ligatures in ligature_sets:
+        for first in list(ligatures):
+            ligatures[first] = [ligature for ligature in ligatures[first] if ligature.LigGlyph in keep]
+            if not ligatures[first]:
+                del ligatures[first]
+
+    options = subset.Options()
+    options.layout_features = ['*']
+    options.flavor = 'woff2'
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text=''.join(names), glyphs=sorted(keep))
+    subsetter.subset(font)
+
+    out = io.BytesIO()
+    font.flavor = 'woff2'
+    font.save(out)
+    return out.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        "Cuts the icon font down to the icons the templates use and writes "
+        "static/css/fonts.css with @font-face rules for the self-hosted fonts. "
+        "Run it after using a new icon in a template."
+    )
+
+    def handle(self, *args, **options):
+        names = template_icon_names()
+        icon_font = subset_icon_font(FONT_DIR / ICON_SOURCE, names)
+        (FONT_DIR / ICON_SUBSET).write_bytes(icon_font)
+
+        faces = [
+            FONT_FACE.format(family=family, weight=weight, file=file, display='swap')
+            for family, weight, file in TEXT_FACES
+        ]
+        # Icons are words until their font loads, so hide them rather than
+        # swap; the preload in base.html keeps that short.
+        faces.append(FONT_FACE.format(family=ICON_FAMILY, weight=400, file=ICON_SUBSET, display='block'))
+        CSS_PATH.write_text(
+            "/* Generated by `manage.py build_fonts`; edit that command, not this file. */\n\n"
+            + '\n'.join(faces),
+            encoding='utf-8',
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {ICON_SUBSET} ({len(icon_font) / 1024:.1f} KB, {len(names)} icons) and {CSS_PATH.name}."
+        ))
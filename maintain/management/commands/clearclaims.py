@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from maintain.models import Claim
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes claims not updated in the last CLAIM_RETENTION seconds. Run it "
+        "from cron (e.g. daily) so applicants' details aren't kept indefinitely."
+    )
+
+    def handle(self, *args, **options):
+        deleted = Claim.delete_expired(settings.CLAIM_RETENTION)
+        if options['verbosity'] >= 1:
+            self.stdout.write(f"Deleted {deleted} claim(s) older than {settings.CLAIM_RETENTION} seconds.")
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from maintain import pdf_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes background PDF jobs older than PDF_JOB_TTL seconds. Run it "
+        "from cron (e.g. hourly) so PDFs nobody downloaded don't linger."
+    )
+
+    def handle(self, *args, **options):
+        deleted = pdf_jobs.purge_expired()
+        if options['verbosity'] >= 1:
+            self.stdout.write(f"Deleted {deleted} PDF job file(s) older than {settings.PDF_JOB_TTL} seconds.")
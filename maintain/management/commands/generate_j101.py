@@ -0,0 +1,142 @@
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import slugify
+
+from maintain import pdf_fill
+from maintain.claim_data import ClaimData
+from maintain.pdf_payload import build_pdf_data
+
+
+def init_worker():
+    # Under the 'spawn' start method the worker starts from a bare interpreter.
+    if not apps.ready:
+        django.setup()
+
+
+def render_record(line_no, line, engine, today):
+    """
+    Turns one JSONL line (a wizard_data dictionary) into a PDF.
+    Returns (line_no, filename, pdf_bytes, error); exactly one of
+    pdf_bytes and error is None.
+    """
+    try:
+        wizard_data = json.loads(line)
+        if not isinstance(wizard_data, dict):
+            raise ValueError(f"expected a JSON object, got {type(wizard_data).__name__}")
+        claim_data = ClaimData.from_wizard_data(wizard_data)
+        pdf_file = pdf_fill.render_j101(build_pdf_data(claim_data, today), engine)
+    except Exception as e:
+        return line_no, None, None, f"{type(e).__name__}: {e}"
+
+    name = slugify(getattr(claim_data.applicant_details, 'full_name', None) or '') or 'claim'
+    return line_no, f'{line_no:06d}_{name}.pdf', pdf_file, None
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders a J101E PDF for every claim in a JSONL file (one wizard_data "
+        "object per line) into a directory or a .zip file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="JSONL file to read, or '-' for standard input.")
+        parser.add_argument(
+            'output',
+            help="Directory to write the PDFs to, or a path ending in .zip to bundle them.",
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Number of render processes (default: one per CPU).",
+        )
+        parser.add_argument(
+            '--engine', choices=sorted(pdf_fill.PDF_ENGINES),
+            help="PDF engine to use (default: settings.PDF_ENGINE).",
+        )
+        parser.add_argument(
+            '--progress-every', type=int, default=100,
+            help="Report progress after this many claims (default: 100).",
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError("--workers must be at least 1.")
+        if options['progress_every'] < 1:
+            raise CommandError("--progress-every must be at least 1.")
+
+        if options['input'] == '-':
+            lines = sys.stdin
+        else:
+            try:
+                lines = open(options['input'], encoding='utf-8')
+            except OSError as e:
+                raise CommandError(f"Could not open {options['input']}: {e}")
+
+        output = options['output']
+        if output.lower().endswith('.zip'):
+            # PDFs are already compressed, so store them as-is.
+            archive = zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED)
+            write = archive.writestr
+        else:
+            archive = None
+            os.makedirs(output, exist_ok=True)
+
+            def write(filename, data):
+                with open(os.path.join(output, filename), 'wb') as f:
+                    f.write(data)
+
+        self.done = self.failed = 0
+        self.progress_every = options['progress_every']
+        self.started = time.perf_counter()
+        today = date.today()
+
+        # Keep only a few records per worker in flight, so the input is
+        # streamed rather than read into memory up front.
+        max_pending = workers * 4
+        pending = set()
+        try:
+            with lines, ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+                for line_no, line in enumerate(lines, start=1):
+                    if not line.strip():
+                        continue
+                    if len(pending) >= max_pending:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        self.collect(finished, write)
+                    pending.add(executor.submit(render_record, line_no, line, options['engine'], today))
+                self.collect(pending, write)
+        finally:
+            if archive is not None:
+                archive.close()
+
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {self.done} PDF(s) to {output} in {elapsed:.1f}s "
+            f"({rate:.1f} claims/s); {self.failed} record(s) skipped."
+        ))
+
+    def collect(self, futures, write):
+        for future in futures:
+            line_no, filename, pdf_file, error = future.result()
+            if error:
+                self.failed += 1
+                self.stderr.write(f"Line {line_no}: skipped ({error})")
+            else:
+                write(filename, pdf_file)
+                self.done += 1
+
+            if (self.done + self.failed) % self.progress_every == 0:
+                elapsed = time.perf_counter() - self.started
+                self.stdout.write(
+                    f"{self.done + self.failed} processed, {self.failed} skipped, "
+                    f"{self.done / elapsed:.1f} claims/s"
+                )
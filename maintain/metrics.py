@@ -0,0 +1,123 @@
+# maintain/metrics.py
+
+"""
+Prometheus metrics for the maintain app, served by the metrics view at
+/metrics.
+
+With gunicorn's several worker processes, each process keeps its own
+counts, so set PROMETHEUS_MULTIPROC_DIR (in the environment or .env) to
+an empty directory shared by the workers. prometheus_client then keeps
+every value in a memory-mapped file there, and /metrics adds up the
+files of all workers, whichever one answers the scrape. gunicorn.conf.py
+clears the directory at startup and retires the files of workers that
+exit. Without it, /metrics reports only the process that answers.
+
+Updating a metric is an in-memory (or mmap) write under a per-process
+lock, so it is cheap enough for every request.
+"""
+
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+REQUEST_DURATION = Histogram(
+    'maintain_request_duration_seconds', "Time taken to produce a response, by URL name.",
+    ['view', 'method', 'status'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+
+PDF_RENDER_DURATION = Histogram(
+    'maintain_pdf_render_duration_seconds', "Time taken to fill a J101, by PDF engine.",
+    ['engine'],
+    buckets=(.025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+PDF_SIZE = Histogram(
+    'maintain_pdf_size_bytes', "Size of rendered J101 PDFs.",
+    buckets=(64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6),
+)
+PDF_CACHE_LOOKUPS = Counter(
+    'maintain_pdf_cache_lookups_total', "PDF cache lookups, by whether the PDF was cached.",
+    ['result'],
+)
+
+# Renders waiting for and holding a slot in admission.RenderLimiter.
+PDF_RENDER_QUEUE = Gauge(
+    'maintain_pdf_render_queue', "PDF renders waiting for, or running in, a render slot.",
+    ['state'], multiprocess_mode='livesum',
+)
+PDF_RENDER_ADMISSIONS = Counter(
+    'maintain_pdf_render_admissions_total',
+    "Requests for a PDF render slot, by outcome (admitted, queued, rejected, timed_out).",
+    ['outcome'],
+)
+
+SESSION_SIZE = Histogram(
+    'maintain_session_payload_bytes', "Size of session data written, before compression.",
+    buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536),
+)
+
+# Drop-off at a step is the difference between how many people were shown
+# it and how many submitted it.
+WIZARD_STEP_VIEWS = Counter(
+    'maintain_wizard_step_views_total', "Wizard steps shown, by step.", ['step'],
+)
+WIZARD_STEP_COMPLETIONS = Counter(
+    'maintain_wizard_step_completions_total', "Wizard steps submitted with valid answers, by step.", ['step'],
+)
+
+
+def view_label(request):
+    # Admin and other namespaced URLs are lumped together, as are 404s,
+    # so the number of label values stays small.
+    match = getattr(request, 'resolver_match', None)
+    if match is None or match.namespace or not match.url_name:
+        return 'other'
+    return match.url_name
+
+
+def observe_request(request, response, started):
+    REQUEST_DURATION.labels(
+        view_label(request), request.method, str(response.status_code),
+    ).observe(time.perf_counter() - started)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            response = await get_response(request)
+            observe_request(request, response, started)
+            return response
+    else:
+        def middleware(request):
+            started = time.perf_counter()
+            response = get_response(request)
+            observe_request(request, response, started)
+            return response
+    return middleware
+
+
+def registry():
+    """
+    The registry to export: every worker's values in multiprocess mode,
+    otherwise this process's.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        collector_registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collector_registry)
+        return collector_registry
+    return REGISTRY
+
+
+def exposition():
+    """
+    Returns (body, content type) of the current metrics in Prometheus'
+    text format.
+    """
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
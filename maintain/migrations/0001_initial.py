@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:38
+
+import maintain.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Claim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(default=maintain.models.new_token, editable=False, max_length=64, unique=True)),
+                ('applicant_details', models.JSONField(blank=True, null=True)),
+                ('respondent_details', models.JSONField(blank=True, null=True)),
+                ('child_details', models.JSONField(blank=True, null=True)),
+                ('applicant_income_assets', models.JSONField(blank=True, null=True)),
+                ('financials', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-updated_at'],
+            },
+        ),
+    ]
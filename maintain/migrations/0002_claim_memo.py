@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintain', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='claim',
+            name='memo',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
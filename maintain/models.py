@@ -1,3 +1,91 @@
-from django.db import models
+import secrets
 
-# Create your models here.
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+from .claim_data import ClaimData
+
+
+def new_token():
+    return secrets.token_urlsafe(32)
+
+
+class Claim(models.Model):
+    """
+    A maintenance claim, saved as the applicant works through the wizard.
+
+    Each wizard step has its own column, so saving a step is an UPDATE
+    of that one column rather than a rewrite of everything collected so
+    far. A claim is found by `token`, a random value kept in the
+    applicant's session (and usable to resume the draft).
+    """
+
+    # The wizard steps, in order; each is also the name of a JSON column
+    # holding that step's answers as encoded by claim_data.ClaimData.
+    STEPS = tuple(ClaimData.STEPS)
+
+    token = models.CharField(max_length=64, unique=True, default=new_token, editable=False)
+    applicant_details = models.JSONField(null=True, blank=True)
+    respondent_details = models.JSONField(null=True, blank=True)
+    child_details = models.JSONField(null=True, blank=True)
+    applicant_income_assets = models.JSONField(null=True, blank=True)
+    financials = models.JSONField(null=True, blank=True)
+    # Step hashes, validation results and derived values (see claims.py).
+    memo = models.JSONField(default=dict, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+
+    def __str__(self):
+        name = (self.applicant_details or {}).get('full_name') or 'Unnamed applicant'
+        return f"{name} ({self.updated_at:%Y-%m-%d %H:%M})"
+
+    @property
+    def claim_data(self):
+        """
+        The answers as typed records (a claim_data.ClaimData).
+        """
+        return ClaimData(memo=self.memo, **{
+            step_name: ClaimData.decode_step(step_name, getattr(self, step_name))
+            for step_name in self.STEPS
+        })
+
+    @classmethod
+    def save_step(cls, token, step_name, data, memo=None):
+        """
+        Stores one step's encoded answers (and the claim's memo, if given)
+        with a single UPDATE, creating the claim if this is its first step.
+        """
+        if step_name not in cls.STEPS:
+            raise ValueError(f"Unknown wizard step {step_name!r}.")
+        values = {step_name: data}
+        if memo is not None:
+            values['memo'] = memo
+        changes = dict(values, updated_at=timezone.now())
+        if cls.objects.filter(token=token).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(token=token, **values)
+        except IntegrityError:
+            # Another request created it first.
+            cls.objects.filter(token=token).update(**changes)
+
+    @classmethod
+    async def asave_step(cls, token, step_name, data, memo=None):
+        # The create needs a transaction, which the async ORM can't open.
+        await sync_to_async(cls.save_step)(token, step_name, data, memo)
+
+    @classmethod
+    def delete_expired(cls, max_age):
+        """
+        Deletes claims not updated in the last `max_age` seconds and
+        returns how many there were.
+        """
+        deleted, _ = cls.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=max_age)).delete()
+        return deleted
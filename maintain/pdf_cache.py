@@ -0,0 +1,190 @@
+# maintain/pdf_cache.py
+
+"""
+A content-addressed cache of rendered J101 PDFs.
+
+A render is keyed by a hash of its {pdf_field_name: value} payload, the
+PDF engine and the template version, so identical answers are only ever
+filled and flattened once. The key doubles as the response's ETag.
+
+Rendered files are kept in a size-bounded in-memory LRU per process and,
+if settings.PDF_CACHE_DIR is set, in a shared on-disk tier whose entries
+expire after settings.PDF_CACHE_TTL seconds.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import metrics, pdf_fill
+
+# How often, at most, the disk tier is swept for expired entries.
+PURGE_INTERVAL = 60
+
+
+def cache_key(pdf_data, engine=None):
+    """
+    Returns a stable hash of everything that determines a render's output.
+    """
+    engine = engine or settings.PDF_ENGINE
+    canonical = json.dumps(
+        [engine, pdf_fill.get_template().mtime, pdf_data],
+        sort_keys=True, separators=(',', ':'), default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, max_bytes, directory=None, ttl=3600):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.last_purge = 0
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                return data
+
+        data = self.read_disk(key)
+        if data is not None:
+            self.remember(key, data)
+        return data
+
+    def put(self, key, data):
+        self.remember(key, data)
+        self.write_disk(key, data)
+
+    def remember(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def disk_path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self.disk_path(key)
+        try:
+            if os.path.getmtime(path) < time.time() - self.ttl:
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write_disk(self, key, data):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.disk_path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.purge_expired()
+
+    def purge_expired(self):
+        now = time.time()
+        if now - self.last_purge < PURGE_INTERVAL:
+            return
+        self.last_purge = now
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < now - self.ttl:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RenderCache(
+                    max_bytes=settings.PDF_CACHE_MAX_BYTES,
+                    directory=settings.PDF_CACHE_DIR,
+                    ttl=settings.PDF_CACHE_TTL,
+                )
+    return _cache
+
+
+def render_j101(pdf_data, key=None, limiter=None):
+    """
+    Like pdf_fill.render_j101, but served from the cache when the same
+    payload has been rendered before. Pass `key` if it is already known.
+
+    If a RenderLimiter is given (see admission.py), a render that isn't
+    cached waits for one of its slots, and may raise admission.Overloaded.
+    """
+    key = key or cache_key(pdf_data)
+    cache = get_cache()
+    pdf_file = cache.get(key)
+    metrics.PDF_CACHE_LOOKUPS.labels('miss' if pdf_file is None else 'hit').inc()
+    if pdf_file is None:
+        with limiter.slot() if limiter else nullcontext():
+            pdf_file = pdf_fill.render_j101(pdf_data)
+        cache.put(key, pdf_file)
+    return pdf_file
+
+
+async def arender_j101(pdf_data, key=None, limiter=None):
+    """
+    render_j101() for async views: the render runs on pdf_fill's render
+    pool, and the cache lookups and stores, which may touch the disk tier,
+    run in worker threads too, so the event loop keeps serving other
+    requests meanwhile.
+    """
+    key = key or cache_key(pdf_data)
+    cache = get_cache()
+    cache_get = sync_to_async(cache.get, thread_sensitive=False)
+    cache_put = sync_to_async(cache.put, thread_sensitive=False)
+    pdf_file = await cache_get(key)
+    metrics.PDF_CACHE_LOOKUPS.labels('miss' if pdf_file is None else 'hit').inc()
+    if pdf_file is None:
+        async with limiter.aslot() if limiter else nullcontext():
+            # Run in a copy of this context, so the render's timing spans
+            # are recorded against the request.
+            rendering = asyncio.get_running_loop().run_in_executor(
+                pdf_fill.get_executor(), contextvars.copy_context().run, pdf_fill.render_j101, pdf_data,
+            )
+            try:
+                pdf_file = await asyncio.shield(rendering)
+            except asyncio.CancelledError:
+                # The render can't be stopped, so keep the slot until it
+                # ends, and cache its result for the next request.
+                await asyncio.wait([rendering])
+                if not rendering.exception():
+                    await cache_put(key, rendering.result())
+                raise
+        await cache_put(key, pdf_file)
+    return pdf_file
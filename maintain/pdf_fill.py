@@ -0,0 +1,340 @@
+# maintain/pdf_fill.py
+
+"""
+Renders the filled J101E PDF entirely in memory.
+
+The template is parsed once per worker process and kept resident, and
+there are two ways of filling it (settings.PDF_ENGINE):
+
+'pymupdf'   Burns each value into the page content as vector text and
+            removes the form, so the download is a plain, flat PDF.
+'acroform'  Never touches the cached template: each render appends an
+            incremental update to the template's original bytes that
+            contains only the widget annotations and the AcroForm
+            dictionary it changed, so every unchanged object is shared
+            copy-on-write. The fields are kept, but made read-only.
+"""
+
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pymupdf
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from . import admission, metrics, profiling, timing
+from .pdf_map import mapped_pdf_fields
+
+TEMPLATE_PATH = settings.BASE_DIR / 'J101_E_fillable.pdf'
+
+# Bit 1 of a field's /Ff entry marks it read-only.
+READ_ONLY_FLAG = 1
+
+# Horizontal padding, in points, between a field's border and its text.
+TEXT_PADDING = 2
+
+# Times Roman, as named in the fields' /DA. Used by the 'pymupdf' engine.
+FONT = pymupdf.Font('tiro')
+
+
+@functools.lru_cache(maxsize=None)
+def char_width(char):
+    return FONT.text_length(char, 1)
+
+
+def text_width(text, fontsize):
+    """
+    Width of `text` in points, from per-character widths cached across renders.
+    """
+    return sum(map(char_width, text)) * fontsize
+
+
+def read_dict(doc, xref):
+    """
+    Returns the entries of the dictionary object `xref` as a
+    {key: pdf_source} dict, e.g. {'FT': '/Tx', 'P': '12 0 R'}.
+    """
+    entries = {}
+    for key in doc.xref_get_keys(xref):
+        kind, value = doc.xref_get_key(xref, key)
+        if kind == 'string':
+            value = pymupdf.get_pdf_str(value)
+        entries[key] = value
+    return entries
+
+
+def format_dict(entries):
+    return '<<' + ''.join(f'/{key} {value}' for key, value in entries.items()) + '>>'
+
+
+class J101Template:
+    """
+    A parsed, read-only copy of the J101E template.
+    Instances are shared between requests, so nothing here may be mutated
+    after __init__ returns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime_ns
+        with open(path, 'rb') as f:
+            self.data = f.read()
+
+        with pymupdf.open(stream=self.data, filetype='pdf') as doc:
+            self.size = doc.xref_length()
+            self.trailer = {
+                key: doc.xref_get_key(-1, key)[1]
+                for key in ('Root', 'Info', 'ID')
+                if doc.xref_get_key(-1, key)[0] != 'null'
+            }
+            self.acroform_xref = int(doc.xref_get_key(doc.pdf_catalog(), 'AcroForm')[1].split()[0])
+            self.acroform = read_dict(doc, self.acroform_xref)
+
+            # Every widget annotation as (xref, entries) in page order, and each
+            # field name's position ("slot") in that list. layout holds what the
+            # 'pymupdf' engine needs to draw a slot: (page number, rect, font size, alignment).
+            self.widgets = []
+            self.layout = []
+            self.slots = {}
+            for page in doc:
+                for widget in page.widgets():
+                    entries = read_dict(doc, widget.xref)
+                    self.slots[widget.field_name] = len(self.widgets)
+                    self.widgets.append((widget.xref, entries))
+                    self.layout.append((page.number, widget.rect, widget.text_fontsize or 10, int(entries.get('Q', 0))))
+            self.page_count = doc.page_count
+
+        # Resolve the whole of pdf_map.py against the template up front, so a map
+        # that drifts from the PDF fails loudly instead of leaving a field blank.
+        missing = [name for name in mapped_pdf_fields() if name not in self.slots]
+        if missing:
+            raise ImproperlyConfigured(
+                f"{os.path.basename(path)} has no fields named {', '.join(repr(n) for n in missing)} "
+                "(referenced in maintain/pdf_map.py)."
+            )
+
+        self.startxref = int(self.data[self.data.rindex(b'startxref') + 9:].split()[0])
+
+    def slot_values(self, pdf_data):
+        """
+        Converts {pdf_field_name: value} into a list indexed by slot.
+        """
+        values = [None] * len(self.widgets)
+        for name, value in pdf_data.items():
+            values[self.slots[name]] = value
+        return values
+
+    def flatten(self, pdf_data):
+        """
+        Returns the template with pdf_data ({pdf_field_name: value}) drawn
+        onto the pages as text, and the form itself removed.
+        """
+        with pymupdf.open(stream=self.data, filetype='pdf') as doc:
+            with timing.span('pdf-fill'):
+                writers = self.text_writers(doc, pdf_data)
+
+            with timing.span('pdf-flatten'):
+                # The template's only annotations are its form widgets, so whole
+                # /Annots arrays can go, along with the form and its usage rights.
+                for page_no in range(self.page_count):
+                    doc.xref_set_key(doc.page_xref(page_no), 'Annots', 'null')
+                doc.xref_set_key(doc.pdf_catalog(), 'AcroForm', 'null')
+                doc.xref_set_key(doc.pdf_catalog(), 'Perms', 'null')
+
+                for page_no, writer in writers.items():
+                    page = doc[page_no]
+                    # Isolate the page's own graphics state (e.g. character spacing) from ours.
+                    page.wrap_contents()
+                    writer.write_text(page)
+
+                # garbage=1 drops the widgets and form scripts that are now unreferenced;
+                # object streams keep the output well under the template's size.
+                return doc.tobytes(garbage=1, deflate=True, use_objstms=1)
+
+    def text_writers(self, doc, pdf_data):
+        """
+        Lays out each value as text where its field's widget is. Returns
+        {page number: pymupdf.TextWriter} for the pages with any values.
+        """
+        writers = {}
+        for (page_no, rect, fontsize, align), value in zip(self.layout, self.slot_values(pdf_data)):
+            text = str(value).strip() if value is not None else ''
+            if not text:
+                continue
+
+            # Shrink long values to fit, as viewers do for auto-sized fields.
+            width = text_width(text, fontsize)
+            if width > rect.width - 2 * TEXT_PADDING:
+                fontsize *= (rect.width - 2 * TEXT_PADDING) / width
+                width = rect.width - 2 * TEXT_PADDING
+
+            if align == 1:
+                x = rect.x0 + (rect.width - width) / 2
+            elif align == 2:
+                x = rect.x1 - TEXT_PADDING - width
+            else:
+                x = rect.x0 + TEXT_PADDING
+            y = rect.y0 + rect.height / 2 + fontsize * (FONT.ascender + FONT.descender) / 2
+
+            if page_no not in writers:
+                writers[page_no] = pymupdf.TextWriter(doc[page_no].rect)
+            writers[page_no].append((x, y), text, font=FONT, fontsize=fontsize)
+        return writers
+
+    def fill_fields(self, pdf_data, read_only=True):
+        """
+        Returns the template with pdf_data ({pdf_field_name: value}) filled in
+        as form field values. With read_only=True every field is locked.
+        """
+        with timing.span('pdf-fill'):
+            updates = self.field_updates(pdf_data, read_only)
+        with timing.span('pdf-write'):
+            return self._write_update(updates)
+
+    def field_updates(self, pdf_data, read_only):
+        """
+        Returns {xref: new dictionary source} for the widgets and AcroForm.
+        """
+        updates = {}
+        for (xref, entries), value in zip(self.widgets, self.slot_values(pdf_data)):
+            if value is None and not read_only:
+                continue
+            # A shallow copy is enough: only top-level entries are replaced.
+            filled = dict(entries)
+            if value is not None:
+                filled['V'] = pymupdf.get_pdf_str(str(value))
+                # The template's appearance shows the old value; let the viewer rebuild it.
+                filled.pop('AP', None)
+            if read_only:
+                filled['Ff'] = str(int(entries.get('Ff', 0)) | READ_ONLY_FLAG)
+            updates[xref] = format_dict(filled)
+
+        acroform = dict(self.acroform, NeedAppearances='true')
+        updates[self.acroform_xref] = format_dict(acroform)
+        return updates
+
+    def _write_update(self, updates):
+        """
+        Appends the updated objects and a cross-reference stream that
+        chains back to the template's own (PDF 1.7, section 7.5.6).
+        """
+        out = bytearray(self.data)
+        if not out.endswith(b'\n'):
+            out += b'\n'
+
+        offsets = {}
+        for xref in sorted(updates):
+            offsets[xref] = len(out)
+            out += f'{xref} 0 obj\n{updates[xref]}\nendobj\n'.encode('latin-1')
+
+        xref_stream = self.size
+        offsets[xref_stream] = len(out)
+        rows = b''.join(b'\x01' + offsets[xref].to_bytes(4, 'big') + b'\x00\x00' for xref in sorted(offsets))
+        trailer = dict(
+            self.trailer,
+            Type='/XRef',
+            Size=str(xref_stream + 1),
+            Prev=str(self.startxref),
+            W='[1 4 2]',
+            Index='[' + ' '.join(f'{xref} 1' for xref in sorted(offsets)) + ']',
+            Length=str(len(rows)),
+        )
+
+        out += f'{xref_stream} 0 obj\n{format_dict(trailer)}\nstream\n'.encode('latin-1')
+        out += rows
+        out += f'\nendstream\nendobj\nstartxref\n{offsets[xref_stream]}\n%%EOF\n'.encode('latin-1')
+        return bytes(out)
+
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def get_template():
+    """
+    Returns the process-wide J101Template, parsing it on first use and
+    again whenever the template file's mtime changes.
+    """
+    global _template
+    mtime = os.stat(TEMPLATE_PATH).st_mtime_ns
+    template = _template
+    if template is None or template.mtime != mtime:
+        with _template_lock:
+            if _template is None or _template.mtime != mtime:
+                _template = J101Template(TEMPLATE_PATH)
+            template = _template
+    return template
+
+
+class BoundedExecutor(ThreadPoolExecutor):
+    """
+    A ThreadPoolExecutor that turns work away with admission.Overloaded
+    once `max_queued` tasks are already waiting for a thread, rather than
+    letting its queue grow without limit.
+    """
+
+    def __init__(self, max_workers, max_queued, **kwargs):
+        super().__init__(max_workers=max_workers, **kwargs)
+        self._room = threading.BoundedSemaphore(max_workers + max_queued)
+
+    def submit(self, fn, /, *args, **kwargs):
+        if not self._room.acquire(blocking=False):
+            raise admission.Overloaded("render pool backlog full", settings.PDF_RENDER_RETRY_AFTER)
+        try:
+            future = super().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._room.release()
+            raise
+        future.add_done_callback(lambda _: self._room.release())
+        return future
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns this process's render pool, creating it on first use (never
+    at import time, so it is not shared across a fork). Background jobs
+    and the async views both render on it, each holding a slot of
+    admission.get_limiter() while queued and running, so the queue stays
+    short; PDF_RENDER_QUEUE bounds it in any case.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = BoundedExecutor(
+                    max_workers=settings.PDF_RENDER_WORKERS,
+                    max_queued=settings.PDF_RENDER_QUEUE,
+                    thread_name_prefix='pdf-render',
+                )
+    return _executor
+
+
+PDF_ENGINES = {
+    'pymupdf': J101Template.flatten,
+    'acroform': J101Template.fill_fields,
+}
+
+
+def render_j101(pdf_data, engine=None):
+    """
+    Fills the J101E template with the given {pdf_field_name: value}
+    dictionary using `engine` (default: settings.PDF_ENGINE) and
+    returns the PDF as bytes.
+    """
+    engine = engine or settings.PDF_ENGINE
+    started = time.perf_counter()
+    # Runs on the render pool for async views, so profile this thread too.
+    with profiling.thread():
+        with timing.span('pdf-template'):
+            template = get_template()
+        pdf_file = PDF_ENGINES[engine](template, pdf_data)
+    metrics.PDF_RENDER_DURATION.labels(engine).observe(time.perf_counter() - started)
+    metrics.PDF_SIZE.observe(len(pdf_file))
+    return pdf_file
@@ -0,0 +1,148 @@
+# maintain/pdf_jobs.py
+
+"""
+Renders J101 PDFs in the background on the process's render pool
+(pdf_fill.get_executor), so the request that asks for one can return a
+job id straight away instead of holding a worker until the render
+finishes.
+
+Job state lives in files under settings.PDF_JOB_DIR rather than in
+memory, so a status or download request can be answered by any worker
+process, not just the one that started the job:
+
+    <job_id>.pending   the job is queued or rendering
+    <job_id>.pdf       the finished PDF, deleted once downloaded
+    <job_id>.failed    the render raised; the file holds the error
+"""
+
+import logging
+import os
+import time
+import uuid
+
+from django.conf import settings
+
+from . import pdf_cache, pdf_fill
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+def job_path(job_id, suffix):
+    return os.path.join(settings.PDF_JOB_DIR, f'{job_id}.{suffix}')
+
+
+def write_atomic(path, data):
+    """
+    Writes via a temporary file so readers never see a partial file.
+    """
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def submit(pdf_data, limiter=None):
+    """
+    Queues a render of pdf_data ({pdf_field_name: value}) and returns its job id.
+    With a `limiter` (admission.RenderLimiter), the job holds one of its
+    slots from now until the render ends; raises admission.Overloaded if
+    none can be had.
+    """
+    os.makedirs(settings.PDF_JOB_DIR, exist_ok=True)
+    purge_expired()
+
+    if limiter:
+        limiter.acquire()
+    job_id = str(uuid.uuid4())
+    try:
+        write_atomic(job_path(job_id, 'pending'), b'')
+        pdf_fill.get_executor().submit(run_job, job_id, pdf_data, limiter)
+    except BaseException:
+        if limiter:
+            limiter.release()
+        remove(job_path(job_id, 'pending'))
+        raise
+    return job_id
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def run_job(job_id, pdf_data, limiter=None):
+    try:
+        pdf_file = pdf_cache.render_j101(pdf_data)
+    except Exception as e:
+        logger.exception("Rendering PDF job %s failed", job_id)
+        write_atomic(job_path(job_id, 'failed'), repr(e).encode())
+    else:
+        write_atomic(job_path(job_id, 'pdf'), pdf_file)
+    finally:
+        if limiter:
+            limiter.release()
+        remove(job_path(job_id, 'pending'))
+
+
+def status(job_id):
+    """
+    Returns PENDING, DONE or FAILED, or None for an unknown (or expired) job.
+    """
+    # The result is written before the pending marker is removed, so check it first.
+    if os.path.exists(job_path(job_id, 'pdf')):
+        return DONE
+    if os.path.exists(job_path(job_id, 'failed')):
+        return FAILED
+    if os.path.exists(job_path(job_id, 'pending')):
+        return PENDING
+    return None
+
+
+def result(job_id):
+    """
+    Returns the finished PDF's bytes, or None if the job is not done.
+    """
+    try:
+        with open(job_path(job_id, 'pdf'), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def pop_result(job_id):
+    """
+    Like result(), but deletes the PDF once read, so a claim's PDF stays
+    on disk no longer than it takes to download it.
+    """
+    pdf_file = result(job_id)
+    if pdf_file is not None:
+        remove(job_path(job_id, 'pdf'))
+    return pdf_file
+
+
+def purge_expired():
+    """
+    Deletes job files older than settings.PDF_JOB_TTL seconds. Runs on
+    every submit, and from the clearpdfjobs command, which should be run
+    on a schedule so that jobs nobody downloaded don't wait for the next
+    submit to be deleted. Returns how many files were deleted.
+    """
+    cutoff = time.time() - settings.PDF_JOB_TTL
+    try:
+        entries = list(os.scandir(settings.PDF_JOB_DIR))
+    except FileNotFoundError:
+        return 0
+    deleted = 0
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                deleted += 1
+        except FileNotFoundError:
+            pass
+    return deleted
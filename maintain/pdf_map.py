@@ -7,6 +7,8 @@ It was generated by manually filling the PDF with unique identifiers
 and then extracting the data.
 """
 
+from .schema import EXPENSES
+
 # 1. Mapping for single, straightforward fields
 PDF_FIELD_MAP = {
     # Page 1 - Applicant
@@ -64,31 +66,8 @@ PDF_FIELD_MAP = {
     'deduction_other': 'otherA',
     'income_nett_salary': 'nett',  
 
-    # Page 3 & 4 - Expenditure Table (Self, Child, Total Columns)
-    'expense_self_lodging': '3 C 1',    'expense_child_lodging': '3 D 1',    'expense_total_lodging': '3 E 1',
-    'expense_self_groceries': '3 C 2',  'expense_child_groceries': '3 D 2',  'expense_total_groceries': '3 E 2',
-    'expense_self_utilities': '3 C 3',  'expense_child_utilities': '3 D 3',  'expense_total_utilities': '3 E 3',
-    'expense_self_rates_taxes': '3 C 4','expense_child_rates_taxes': '3 D 4','expense_total_rates_taxes': '3 E 4',
-    'expense_self_laundry': '3 C 5',    'expense_child_laundry': '3 D 5',    'expense_total_laundry': '3 E 5',
-    'expense_self_telephone': '3 C 7',  'expense_child_telephone': '3 D 7',  'expense_total_telephone': '3 E 7',
-    
-    'expense_self_clothing': '3 C 13',  'expense_child_clothing': '3 D 13',  'expense_total_clothing': '3 E 13',
-    'expense_child_school_uniforms': '3 D 14', 'expense_total_school_uniforms': '3 E 14', # No 'self' field
-    
-    'expense_self_transport_public': '3 C 15', 'expense_child_transport_public': '3 D 15', 'expense_total_transport_public': '3 E 15',
-    'expense_self_car_insurance': '3 C 16',    'expense_child_car_insurance': '3 D 16',    'expense_total_car_insurance': '3 E 16',
-    'expense_self_car_maintenance': '3 C 17',  'expense_child_car_maintenance': '3 D 17',  'expense_total_car_maintenance': '3 E 17',
-    'expense_self_fuel': '3 C 18',             'expense_child_fuel': '3 D 18',             'expense_total_fuel': '3 E 18',
-    
-    'expense_child_school_fees': '3 D 19',  'expense_total_school_fees': '3 E 19',
-    'expense_child_stationery': '3 D 20',   'expense_total_stationery': '3 E 20',
-    'expense_child_extramural': '3 D 21',   'expense_total_extramural': '3 E 21',
-
-    'expense_self_medical': '3 C 22',   'expense_child_medical': '3 D 22',   'expense_total_medical': '3 E 22',
-    'expense_self_medication': '3 C 23', 'expense_child_medication': '3 D 23', 'expense_total_medication': '3 E 23',
-
-    'expense_self_entertainment': '3 C 26', 'expense_child_entertainment': '3 D 26', 'expense_total_entertainment': '3 E 26',
-    'expense_self_other': '3 C 55',         'expense_child_other': '3 D 55',         'expense_total_other': '3 F 55', # Note the F key
+    # Page 3 & 4 - Expenditure Table: one row per schema.EXPENSES entry, which
+    # declares its own PDF fields. Only the grand totals are mapped here.
 
     # Page 5 - Grand Totals (using new keys from your mapping)
     'expenditure_total_self_col': '3 D 60',
@@ -112,4 +91,20 @@ PDF_CHILD_MAP = {
     3: {'amount': '2 G2', 'name': '2 G3', 'dob': ['2 G 4a', '2 G 4b', '2 G 4c', '2 G 4d', '2 G 4e', '2 G 4f', '2 G 4g', '2 G 4h']},
     4: {'amount': '2 H2', 'name': '2 H3', 'dob': ['2 H 4a', '2 H 4b', '2 H 4c', '2 H 4d', '2 H 4e', '2 H 4f', '2 H 4g', '2 H 4h']},
     5: {'amount': '2 I2', 'name': '2 I3', 'dob': ['2 I 4a', '2 I 4b', '2 I 4c', '2 I 4d', '2 I 4e', '2 I 4f', '2 I 4g', '2 I 4h']},
-}
\ No newline at end of file
+}
+
+
+def mapped_pdf_fields():
+    """
+    Yields every PDF field name referenced by the three maps above and by
+    the expense categories in schema.EXPENSES.
+    """
+    yield from PDF_FIELD_MAP.values()
+    for expense in EXPENSES:
+        yield from (key for key in expense.pdf_keys if key)
+    for keys in PDF_CHAR_MAP.values():
+        yield from keys
+    for child_keys in PDF_CHILD_MAP.values():
+        yield child_keys['amount']
+        yield child_keys['name']
+        yield from child_keys['dob']
@@ -0,0 +1,190 @@
+# maintain/pdf_payload.py
+
+"""
+Builds the J101E payload: the flat {pdf_field_name: value} dictionary
+that pdf_fill renders.
+
+Everything here is a pure function of the answers (a ClaimData, no
+request, session or file I/O), so the CPU-bound mapping stage can be
+profiled and optimised on its own, and run in bulk (see the generate_j101
+command). The answers arrive already typed, so no amount or date is
+parsed here.
+"""
+
+from datetime import date
+from functools import lru_cache
+
+from . import derived, utils
+from .claim_data import ApplicantDetails, ApplicantIncomeAssets, Financials, RespondentDetails
+from .derived import ZERO, get_decimal
+from .pdf_map import PDF_CHAR_MAP, PDF_CHILD_MAP, PDF_FIELD_MAP
+from .schema import EXPENSE_PDF_ROWS
+
+# Logical fields on the form that take a plain amount from applicant_income_assets.
+ASSET_FIELDS = (
+    ('asset_fixed_property', 'fixed_property'),
+    ('asset_investments', 'investments'),
+    ('asset_savings', 'savings'),
+    ('asset_shares', 'shares'),
+    ('asset_motor_vehicles', 'motor_vehicles'),
+    ('deduction_tax', 'tax'),
+    ('deduction_medical_aid', 'medical_aid'),
+    ('deduction_pension', 'pension'),
+    ('deduction_other', 'other_deductions'),
+)
+
+# Values that leave a PDF field blank rather than printing a zero.
+BLANK_VALUES = frozenset(['0.00', '0'])
+
+
+# Most claims share a small set of amounts ('0.00', round figures), so
+# formatting is memoised.
+@lru_cache(maxsize=4096)
+def format_amount(amount):
+    return f"{amount:.2f}"
+
+
+def get_text(record, name):
+    value = getattr(record, name, None)
+    return '' if value is None else str(value)
+
+
+def format_date(value):
+    return value.isoformat() if value else ''
+
+
+def join_address(address, postal_code):
+    return f"{address}, {postal_code}" if postal_code else address
+
+
+def split_phone(phone):
+    """
+    Splits a phone number into its 3-digit code and the rest.
+    """
+    phone = str(phone).replace(' ', '')
+    return phone[:3], phone[3:]
+
+
+def map_chars(final_pdf_data, pdf_keys, string_data, length):
+    string_data = str(string_data).ljust(length)
+    for i, key in enumerate(pdf_keys):
+        final_pdf_data[key] = string_data[i]
+
+
+def build_pdf_data(claim_data, today=None, derived_values=None):
+    """
+    Maps a claim's answers (a ClaimData) onto the J101E form, returning a
+    {pdf_field_name: value} dictionary ready for pdf_fill.render_j101.
+    Ages are worked out as at `today` (default: the current date), unless
+    the claim's already computed `derived_values` are passed in.
+    """
+    if derived_values is None:
+        derived_values = derived.compute(claim_data, today or date.today())
+
+    # A step not yet completed reads as a record with no answers.
+    applicant = claim_data.applicant_details or ApplicantDetails()
+    respondent = claim_data.respondent_details or RespondentDetails()
+    children = claim_data.child_details or []
+    income_assets = claim_data.applicant_income_assets or ApplicantIncomeAssets()
+    financials = claim_data.financials or Financials()
+
+    final_pdf_data = {}
+
+    # --- 1. INCOME & ASSETS ---
+    applicant_dob = derived_values.applicant_dob
+    respondent_dob = derived_values.respondent_dob
+
+    applicant_phone_code, applicant_phone_number = split_phone(get_text(applicant, 'contact_phone'))
+    respondent_phone_code, respondent_phone_number = split_phone(get_text(respondent, 'contact_phone'))
+
+    reason_liable = utils.wrap_text(get_text(financials, 'legally_liable_reason'), 75)
+    reason_care = utils.wrap_text(get_text(financials, 'child_in_care_reason'), 65)
+    other_contributions = utils.wrap_text(get_text(financials, 'other_contributions_text'), 80)
+
+    logical_data = {
+        'applicant_ref_no': "",
+        'applicant_name': get_text(applicant, 'full_name'),
+        'applicant_age': derived_values.applicant_age,
+        'applicant_address_1': utils.wrap_text(join_address(get_text(applicant, 'residential_address'), applicant.postal_code), 85)[0],
+        'applicant_phone_code': applicant_phone_code,
+        'applicant_phone_number': applicant_phone_number,
+        'applicant_work_address_1': get_text(applicant, 'work_address'),
+        'applicant_work_phone': get_text(applicant, 'work_phone'),
+        'applicant_police_station': get_text(applicant, 'nearest_police_station'),
+        'respondent_name': get_text(respondent, 'full_name'),
+        'respondent_age': derived_values.respondent_age,
+        'respondent_address_1': utils.wrap_text(join_address(get_text(respondent, 'home_address'), respondent.postal_code), 85)[0],
+        'respondent_phone_code': respondent_phone_code,
+        'respondent_phone_number': respondent_phone_number,
+        'respondent_work_address_1': get_text(respondent, 'work_address'),
+        'respondent_work_phone': get_text(respondent, 'work_phone'),
+        'reason_liable_1': reason_liable[0],
+        'reason_liable_2': reason_liable[1],
+        'reason_care_1': reason_care[0],
+        'reason_care_2': reason_care[1],
+        'date_not_supported': format_date(getattr(financials, 'date_not_supported', None)),
+        'first_payment_date': format_date(getattr(financials, 'first_payment_date', None)),
+        'payment_in_favour_of': get_text(financials, 'payment_in_favour_of'),
+        'payment_day': get_text(financials, 'payment_day'),
+        'payment_made_to': get_text(financials, 'payment_made_to'),
+        'other_contributions_1': other_contributions[0],
+        'other_contributions_2': other_contributions[1],
+        # Income & Deductions (with calculations)
+        'income_gross_salary': format_amount(get_decimal(income_assets, 'gross_salary')),
+        'income_other_1': format_amount(get_decimal(income_assets, 'other_income_1')),
+        'income_nett_salary': format_amount(derived_values.nett_salary),
+        'income_total': format_amount(derived_values.total_income),
+    }
+    for logical_name, form_field in ASSET_FIELDS:
+        logical_data[logical_name] = format_amount(get_decimal(income_assets, form_field))
+
+    for logical_name, value in logical_data.items():
+        if value and str(value) not in BLANK_VALUES:
+            final_pdf_data[PDF_FIELD_MAP[logical_name]] = value
+
+    # --- 2. CHARACTER-BY-CHARACTER FIELDS ---
+    map_chars(final_pdf_data, PDF_CHAR_MAP['applicant_dob'], applicant_dob.strftime('%d%m%y') if applicant_dob else '------', 6)
+    map_chars(final_pdf_data, PDF_CHAR_MAP['applicant_id'], get_text(applicant, 'id_number'), 13)
+    map_chars(final_pdf_data, PDF_CHAR_MAP['respondent_dob'], respondent_dob.strftime('%d%m%y') if respondent_dob else '------', 6)
+    map_chars(final_pdf_data, PDF_CHAR_MAP['respondent_id'], get_text(respondent, 'id_number'), 13)
+
+    # --- 3. THE CHILDREN TABLE ---
+    total_maintenance_claimed = get_decimal(financials, 'total_maintenance_claimed')
+    amount_per_child = format_amount(derived_values.amount_per_child)
+
+    for child, map_keys in zip(children, PDF_CHILD_MAP.values()):
+        # Use the calculated per-child amount
+        final_pdf_data[map_keys['amount']] = amount_per_child
+        final_pdf_data[map_keys['name']] = get_text(child, 'full_name')
+
+        formatted_dob = child.date_of_birth.strftime('%d%m%Y') if child.date_of_birth else '--------'
+        map_chars(final_pdf_data, map_keys['dob'], formatted_dob, 8)
+
+    final_pdf_data[PDF_FIELD_MAP['claim_total']] = format_amount(total_maintenance_claimed)
+
+    # --- 4. THE EXPENDITURE TABLE ---
+    for self_field, child_field, self_pdf_key, child_pdf_key, total_pdf_key in EXPENSE_PDF_ROWS:
+        self_amount = get_decimal(financials, self_field) if self_field else ZERO
+        child_amount = get_decimal(financials, child_field)
+        row_total = self_amount + child_amount
+
+        # Populate PDF fields for this row if values are not zero
+        if self_amount > 0 and self_pdf_key:
+            final_pdf_data[self_pdf_key] = format_amount(self_amount)
+        if child_amount > 0 and child_pdf_key:
+            final_pdf_data[child_pdf_key] = format_amount(child_amount)
+        if row_total > 0 and total_pdf_key:
+            final_pdf_data[total_pdf_key] = format_amount(row_total)
+
+    total_self_expenditure = derived_values.total_self_expenditure
+    total_child_expenditure = derived_values.total_child_expenditure
+    final_total_expenditure = total_self_expenditure + total_child_expenditure
+
+    if total_self_expenditure > 0:
+        final_pdf_data[PDF_FIELD_MAP['expenditure_total_self_col']] = format_amount(total_self_expenditure)
+    if total_child_expenditure > 0:
+        final_pdf_data[PDF_FIELD_MAP['expenditure_total_child_col']] = format_amount(total_child_expenditure)
+    if final_total_expenditure > 0:
+        final_pdf_data[PDF_FIELD_MAP['expenditure_total_final']] = format_amount(final_total_expenditure)
+
+    return final_pdf_data
@@ -0,0 +1,313 @@
+# maintain/profiling.py
+
+"""
+On-demand profiling of the slow views (generate_pdf and claim_wizard).
+
+With settings.PROFILING on, a view wrapped in @profiled is run under a
+profiler when a staff user sends an `X-Profile: 1` header, or at random
+for a PROFILE_SAMPLE_RATE fraction of requests. With it off, @profiled
+returns the view unchanged, so there is no cost at all.
+
+settings.PROFILER picks the profiler:
+
+- 'cprofile' saves a pstats file (`python -m pstats`, snakeviz).
+- 'sampling' looks at the stacks every few milliseconds and saves them
+  in collapsed form, one `frame;frame;frame count` line per stack, for
+  flamegraph.pl or speedscope. It costs less than cProfile, which adds
+  to the time of every Python call.
+
+Besides the view's own thread, the render thread of generate_pdf is
+profiled (see pdf_fill.render_j101); work that sync_to_async sends to
+other threads, such as database queries, shows up as time waiting. Under
+an ASGI server, other requests running on the same event loop meanwhile
+are profiled along with the request.
+
+From Python 3.12 cProfile is built on sys.monitoring: one profile sees
+every thread, and only one can run in a process at a time. A 'cprofile'
+request that arrives while another is being profiled is run without a
+profile, and a profile includes whatever else the process did meanwhile.
+Profiling never fails a request.
+
+Profiles are saved in settings.PROFILE_DIR, which keeps only the newest
+PROFILE_KEEP of them; staff can download them from the profiles_page view.
+"""
+
+import cProfile
+import functools
+import logging
+import marshal
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+SAMPLE_INTERVAL = 0.005
+
+# See the module docstring.
+CPROFILE_PER_PROCESS = sys.version_info >= (3, 12)
+
+# e.g. 20261017-050852-123456_generate_pdf_812ms.prof
+PROFILE_NAME_RE = re.compile(
+    r'^(?P<time>\d{8}-\d{6}-\d{6})_(?P<view>\w+?)_(?P<ms>\d+)ms\.(?P<format>prof|collapsed)$'
+)
+
+_current = ContextVar('profile', default=None)
+
+
+class Profiler:
+    """
+    Profiles the threads working for one request. Subclasses record the
+    threads between add_thread() and remove_thread(), and dump() returns
+    the profile as the bytes of a file, unless empty() says nothing was
+    recorded.
+    """
+    extension = None
+
+    def __init__(self):
+        self.seen = set()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @contextmanager
+    def thread(self):
+        ident = threading.get_ident()
+        if ident in self.seen:
+            # Already profiled further up this thread's stack.
+            yield
+            return
+        self.seen.add(ident)
+        self.add_thread(ident)
+        try:
+            yield
+        finally:
+            self.remove_thread(ident)
+            self.seen.discard(ident)
+
+
+class CProfiler(Profiler):
+    extension = 'prof'
+
+    def __init__(self):
+        super().__init__()
+        # cProfile only sees the thread that enabled it, so each thread
+        # gets its own, and they are added up when saved.
+        self.finished = []
+        self.running = {}
+
+    def add_thread(self, ident):
+        if CPROFILE_PER_PROCESS and self.running:
+            return  # The running profile sees this thread too.
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another request's profile is running.
+            logger.warning("Not profiling thread %d: another profile is running.", ident)
+            return
+        self.running[ident] = profile
+
+    def remove_thread(self, ident):
+        profile = self.running.pop(ident, None)
+        if profile is not None:
+            profile.disable()
+            self.finished.append(profile)
+
+    def empty(self):
+        return not self.finished
+
+    def dump(self):
+        # A render that outlived its request (see pdf_cache.arender_j101)
+        # may still be running; it is left out.
+        return marshal.dumps(pstats.Stats(*self.finished).stats)
+
+
+class SamplingProfiler(Profiler):
+    extension = 'collapsed'
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self.threads = set()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self.sampler.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.sampler.join()
+
+    def add_thread(self, ident):
+        self.threads.add(ident)
+
+    def remove_thread(self, ident):
+        self.threads.discard(ident)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[collapse(frame)] += 1
+
+    def empty(self):
+        return not self.stacks
+
+    def dump(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common()).encode()
+
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+PROFILERS = {'cprofile': CProfiler, 'sampling': SamplingProfiler}
+
+
+def thread():
+    """
+    Profiles the current thread for the duration of the block, if it is
+    working for a profiled request.
+    """
+    profiler = _current.get()
+    return profiler.thread() if profiler else nullcontext()
+
+
+@contextmanager
+def profiling(view_name):
+    """
+    Profiles the block, and the threads it hands work to, and saves the
+    profile when it ends.
+    """
+    profiler = PROFILERS[settings.PROFILER]()
+    token = _current.set(profiler)
+    profiler.start()
+    started = time.perf_counter()
+    try:
+        with profiler.thread():
+            yield
+    finally:
+        seconds = time.perf_counter() - started
+        profiler.stop()
+        _current.reset(token)
+        try:
+            if not profiler.empty():
+                save(profiler, view_name, seconds)
+        except Exception:
+            logger.exception("Could not save a profile of %s", view_name)
+
+
+def sampled():
+    rate = settings.PROFILE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def profiled(view):
+    """
+    Lets requests to `view`, sync or async, be profiled (see above).
+    """
+    if not settings.PROFILING:
+        return view
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if PROFILE_HEADER in request.headers:
+                wanted = (await request.auser()).is_staff
+            else:
+                wanted = sampled()
+            if not wanted:
+                return await view(request, *args, **kwargs)
+            with profiling(view.__name__):
+                return await view(request, *args, **kwargs)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            wanted = request.user.is_staff if PROFILE_HEADER in request.headers else sampled()
+            if not wanted:
+                return view(request, *args, **kwargs)
+            with profiling(view.__name__):
+                return view(request, *args, **kwargs)
+    return wrapper
+
+
+def profile_dir():
+    return Path(settings.PROFILE_DIR)
+
+
+def save(profiler, view_name, seconds):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f'{datetime.now():%Y%m%d-%H%M%S-%f}_{view_name}_{round(seconds * 1000)}ms.{profiler.extension}'
+    tmp_path = directory / f'{name}.{os.getpid()}.tmp'
+    tmp_path.write_bytes(profiler.dump())
+    os.replace(tmp_path, directory / name)
+    logger.info("Saved profile %s", name)
+    # The directory is a ring buffer: drop all but the newest PROFILE_KEEP.
+    for old in saved_profiles()[settings.PROFILE_KEEP:]:
+        (directory / old['name']).unlink(missing_ok=True)
+
+
+def saved_profiles():
+    """
+    The saved profiles, newest first, as dicts of their file name, time,
+    view, duration in ms, format ('prof' or 'collapsed') and size.
+    """
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in directory.iterdir():
+        match = PROFILE_NAME_RE.match(path.name)
+        if not match:
+            continue
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            continue  # Dropped by another process just now.
+        profiles.append({
+            'name': path.name,
+            'time': datetime.strptime(match['time'], '%Y%m%d-%H%M%S-%f'),
+            'view': match['view'],
+            'ms': int(match['ms']),
+            'format': match['format'],
+            'size': size,
+        })
+    profiles.sort(key=lambda profile: profile['name'], reverse=True)
+    return profiles
+
+
+def profile_path(name):
+    """
+    The path of the saved profile `name`, or None if there is no such
+    profile. Only names of saved profiles are accepted, never paths.
+    """
+    if not PROFILE_NAME_RE.match(name):
+        return None
+    path = profile_dir() / name
+    return path if path.is_file() else None
@@ -0,0 +1,112 @@
+# maintain/schema.py
+
+"""
+The monthly expense categories, declared once.
+
+Everything else is derived from EXPENSES when this module is imported:
+the expense fields of forms.FinancialsForm (and therefore the typed
+records and CSV columns), the rows of the wizard's expense table, the
+expense lines on the summary page and the expenditure table on the
+J101. A category is added, renamed or moved on the PDF here and nowhere
+else.
+"""
+
+
+class Expense:
+    """
+    One expense category. Its form fields are self_<name> (the applicant's
+    share, unless children_only) and child_<name> (the children's share).
+    On page 3 of the J101 it fills row `pdf_row`, in the self, children
+    and total columns given by `pdf_columns`.
+    """
+
+    __slots__ = ('name', 'label', 'group', 'hint', 'children_only', 'self_field', 'child_field', 'pdf_keys')
+
+    def __init__(self, name, label, group, pdf_row, hint=None, children_only=False, pdf_columns='CDE'):
+        self.name = name
+        self.label = label
+        self.group = group
+        self.hint = hint
+        self.children_only = children_only
+        self.self_field = None if children_only else f'self_{name}'
+        self.child_field = f'child_{name}'
+        self_column, child_column, total_column = pdf_columns
+        # (self, children, total) PDF field names; no self field for children-only rows.
+        self.pdf_keys = (
+            None if children_only else f'3 {self_column} {pdf_row}',
+            f'3 {child_column} {pdf_row}',
+            f'3 {total_column} {pdf_row}',
+        )
+
+    def share_labels(self):
+        """
+        Yields (form field name, label) for each of this category's fields.
+        """
+        suffix = f" ({self.hint})" if self.hint else ""
+        if self.self_field:
+            yield self.self_field, f"Your Share{suffix}"
+        yield self.child_field, f"Child(ren)'s Share{suffix}"
+
+
+EXPENSES = (
+    Expense('lodging', "Lodging (Rent/Bond)", "Household", pdf_row=1),
+    Expense('groceries', "Groceries / Food", "Household", pdf_row=2),
+    Expense('utilities', "Water & Electricity", "Household", pdf_row=3, hint="Water/Elec"),
+    Expense('rates_taxes', "Rates & Taxes", "Household", pdf_row=4),
+    Expense('laundry', "Laundry / Cleaning", "Household", pdf_row=5),
+    Expense('telephone', "Telephone / Cellphone", "Household", pdf_row=7),
+    Expense('clothing', "Clothes & Shoes", "Clothing", pdf_row=11, hint="Clothes/Shoes"),
+    Expense('school_uniforms', "School Uniforms", "Clothing", pdf_row=12, children_only=True),
+    Expense('sports_clothes', "Sports Clothes", "Clothing", pdf_row=13, children_only=True),
+    Expense('transport_public', "Public Transport / Lift Club", "Transport", pdf_row=14, hint="Bus/Taxi"),
+    Expense('car_fuel', "Car: Fuel", "Transport", pdf_row=17),
+    Expense('car_maintenance', "Car: Maintenance", "Transport", pdf_row=16),
+    Expense('car_insurance', "Car: Insurance & Installments", "Transport", pdf_row=15),
+    Expense('school_fees', "School Fees", "Education", pdf_row=20, children_only=True),
+    Expense('stationery', "Books & Stationery", "Education", pdf_row=23, children_only=True, hint="Books/Stationery"),
+    Expense('extramural', "Outings & Extramurals", "Education", pdf_row=24, children_only=True),
+    Expense('medical_uncovered', "Doctor / Dentist", "Medical (uncovered)", pdf_row=27, hint="Doctor/Dentist"),
+    Expense('medication_uncovered', "Medication", "Medical (uncovered)", pdf_row=28),
+    Expense('entertainment', "Holidays & Entertainment", "Other", pdf_row=35, hint="Holidays/Entertainment"),
+    # Rows 55-59 have a description column first, so their amounts sit one column to the right.
+    Expense('other', "Other Significant Expenses", "Other", pdf_row=55, pdf_columns='DEF'),
+)
+
+
+# --- Lookup tables, compiled once ---
+
+# [(group, (expense, ...)), ...] in declaration order, for the wizard's expense table.
+EXPENSE_GROUPS = []
+for _expense in EXPENSES:
+    if not EXPENSE_GROUPS or EXPENSE_GROUPS[-1][0] != _expense.group:
+        EXPENSE_GROUPS.append((_expense.group, []))
+    EXPENSE_GROUPS[-1][1].append(_expense)
+EXPENSE_GROUPS = tuple((group, tuple(expenses)) for group, expenses in EXPENSE_GROUPS)
+del _expense
+
+# Every expense form field name, in form order.
+EXPENSE_FIELDS = tuple(
+    field_name for expense in EXPENSES for field_name, _ in expense.share_labels()
+)
+EXPENSE_FIELD_SET = frozenset(EXPENSE_FIELDS)
+
+# (self field, child field, self PDF key, child PDF key, total PDF key) per
+# category, for the J101's expenditure table. The self field and key are None
+# for children-only categories.
+EXPENSE_PDF_ROWS = tuple(
+    (expense.self_field, expense.child_field) + expense.pdf_keys for expense in EXPENSES
+)
+
+
+def expense_lines(financials):
+    """
+    Returns (label, self amount, children's amount) for each category
+    with an amount in `financials` (a claim_data.Financials record).
+    """
+    lines = []
+    for expense in EXPENSES:
+        self_amount = getattr(financials, expense.self_field) if expense.self_field else None
+        child_amount = getattr(financials, expense.child_field)
+        if self_amount or child_amount:
+            lines.append((expense.label, self_amount, child_amount))
+    return lines
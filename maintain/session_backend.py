@@ -0,0 +1,87 @@
+# maintain/session_backend.py
+
+"""
+The session engine (settings.SESSION_ENGINE = 'maintain.session_backend').
+
+It is Django's cached_db engine, with the cache in front of the database
+chosen by settings.SESSION_CACHE (a DummyCache when there is none), plus
+write coalescing: a request that marks the session modified but leaves
+its contents exactly as they were loaded (e.g. re-setting current_step to
+the same step) does not write anything.
+
+Payloads are already zlib-compressed by SessionBase.encode whenever that
+makes them smaller, so no extra compression is applied here.
+"""
+
+import hashlib
+from datetime import date
+
+from django.contrib.sessions.backends import cached_db
+
+from . import metrics, timing
+
+# Day number of the last write. Because the contents change once a day, an
+# active session is still re-saved, and its expiry pushed back, at least daily.
+REFRESHED_KEY = '_refreshed_on'
+
+
+def payload_digest(payload):
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+class SessionStore(cached_db.SessionStore):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._stored_digest = None
+
+    def digest(self, session_dict):
+        return payload_digest(self.serializer().dumps(session_dict))
+
+    def load(self):
+        with timing.span('session-load'):
+            session_dict = super().load()
+        if self.session_key is not None:
+            self._stored_digest = self.digest(session_dict)
+        return session_dict
+
+    async def aload(self):
+        with timing.span('session-load'):
+            session_dict = await super().aload()
+        if self.session_key is not None:
+            self._stored_digest = self.digest(session_dict)
+        return session_dict
+
+    def refreshed_digest(self, session_dict, must_create):
+        """
+        Stamps the session with today's date and returns its digest, or
+        None if it is stored exactly like that already.
+        """
+        session_dict[REFRESHED_KEY] = date.today().toordinal()
+        payload = self.serializer().dumps(session_dict)
+        digest = payload_digest(payload)
+        if not must_create and digest == self._stored_digest:
+            return None
+        metrics.SESSION_SIZE.observe(len(payload))
+        return digest
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+
+        digest = self.refreshed_digest(self._get_session(no_load=must_create), must_create)
+        if digest is None:
+            return
+        with timing.span('session-save'):
+            super().save(must_create=must_create)
+        self._stored_digest = digest
+
+    async def asave(self, must_create=False):
+        if self.session_key is None:
+            return await self.acreate()
+
+        digest = self.refreshed_digest(await self._aget_session(no_load=must_create), must_create)
+        if digest is None:
+            return
+        with timing.span('session-save'):
+            await super().asave(must_create=must_create)
+        self._stored_digest = digest
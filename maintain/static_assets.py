@@ -0,0 +1,170 @@
+# maintain/static_assets.py
+
+"""
+The collectstatic pipeline and, where nothing in front of Django serves
+/static/, a view that serves its output.
+
+StaticAssetStorage extends ManifestStaticFilesStorage, so every collected
+file gets a content-hashed name that can be cached forever. On top of
+that it:
+
+- writes resized WebP and PNG copies of raster images, named
+  '<name>-<width>w.<format>' and hashed like any other file, which
+  templates list in a srcset with {% responsive_srcset %};
+- writes a gzipped '<hashed name>.gz' next to each hashed text file
+  (CSS, JS, SVG), which serve() sends to clients that accept gzip.
+"""
+
+import gzip
+import io
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.files.base import ContentFile
+from django.http import Http404
+from django.utils.cache import patch_vary_headers
+from django.views import static
+from PIL import Image, UnidentifiedImageError
+
+# Widths of the resized copies; images are never scaled up, and a copy
+# at the image's own width is always written.
+RESPONSIVE_WIDTHS = (480, 960)
+RESPONSIVE_SOURCES = ('.png', '.jpg', '.jpeg')
+RESPONSIVE_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'png': {'format': 'PNG', 'optimize': True},
+}
+
+GZIP_EXTENSIONS = ('.css', '.js', '.svg')
+# Files this small gain nothing from compression.
+GZIP_MIN_SIZE = 512
+
+# For hashed names; a changed file gets a new name rather than a new version.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# For anything requested by its plain name.
+DEFAULT_CACHE_CONTROL = 'public, max-age=300'
+
+VARIANT_RE = re.compile(r'^(?P<stem>.+)-(?P<width>\d+)w\.(?P<format>[a-z]+)$')
+
+
+def variant_name(name, width, fmt):
+    return f'{posixpath.splitext(name)[0]}-{width}w.{fmt}'
+
+
+def resize(image, width):
+    if width == image.width:
+        return image
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+class StaticAssetStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            # Added to `paths` so they are hashed and listed in the manifest.
+            for name in [name for name in paths if name.lower().endswith(RESPONSIVE_SOURCES)]:
+                storage, path = paths[name]
+                for variant in self.write_variants(storage, path, name):
+                    paths[variant] = (self, variant)
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        if not dry_run:
+            for hashed_name in set(self.hashed_files.values()):
+                if hashed_name.endswith(GZIP_EXTENSIONS):
+                    self.write_gzip(hashed_name)
+
+    def write_variants(self, storage, path, name):
+        """
+        Writes the resized copies of the image `name`, and returns their names.
+        """
+        try:
+            with storage.open(path) as f:
+                image = Image.open(f)
+                image.load()
+        except (UnidentifiedImageError, OSError):
+            return []
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+
+        widths = sorted({width for width in RESPONSIVE_WIDTHS if width < image.width} | {image.width})
+        names = []
+        for width in widths:
+            resized = resize(image, width)
+            for fmt, save_options in RESPONSIVE_FORMATS.items():
+                buffer = io.BytesIO()
+                resized.save(buffer, **save_options)
+                names.append(self.replace(variant_name(name, width, fmt), buffer.getvalue()))
+        return names
+
+    def write_gzip(self, hashed_name):
+        with self.open(hashed_name) as f:
+            content = f.read()
+        if len(content) < GZIP_MIN_SIZE:
+            return
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < len(content):
+            self.replace(f'{hashed_name}.gz', compressed)
+
+    def replace(self, name, content):
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(content))
+        return name
+
+
+def responsive_variants(name, fmt):
+    """
+    Returns [(width, variant name)] for the collected copies of the image
+    `name` in `fmt`, narrowest first, or [] if there are none.
+    """
+    index = getattr(staticfiles_storage, 'responsive_index', None)
+    if index is None:
+        index = {}
+        for variant in getattr(staticfiles_storage, 'hashed_files', {}):
+            match = VARIANT_RE.match(variant)
+            if match:
+                key = (match['stem'], match['format'])
+                index.setdefault(key, []).append((int(match['width']), variant))
+        for variants in index.values():
+            variants.sort()
+        staticfiles_storage.responsive_index = index
+    return index.get((posixpath.splitext(name)[0], fmt), [])
+
+
+def hashed_names():
+    names = getattr(staticfiles_storage, 'hashed_names', None)
+    if names is None:
+        names = staticfiles_storage.hashed_names = frozenset(staticfiles_storage.hashed_files.values())
+    return names
+
+
+def serve(request, path):
+    """
+    Serves a collected file from STATIC_ROOT, gzipped where the client
+    accepts it, with far-future caching for hashed names.
+    """
+    hashed = path in hashed_names()
+    served = path
+    if path.endswith(GZIP_EXTENSIONS) and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        # Only hashed files have a gzipped copy.
+        if hashed and os.path.isfile(os.path.join(settings.STATIC_ROOT, f'{path}.gz')):
+            # mimetypes reads 'x.css.gz' as text/css with gzip encoding, and
+            # static.serve() sets both headers from that.
+            served = f'{path}.gz'
+    elif mimetypes.guess_type(path)[1]:
+        # Don't serve the .gz files themselves.
+        raise Http404
+
+    response = static.serve(request, served, document_root=settings.STATIC_ROOT)
+    if path.endswith(GZIP_EXTENSIONS):
+        patch_vary_headers(response, ['Accept-Encoding'])
+    if hashed:
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers['Cache-Control'] = DEFAULT_CACHE_CONTROL
+    return response
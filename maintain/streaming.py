@@ -0,0 +1,40 @@
+# maintain/streaming.py
+
+"""
+StreamingHttpResponse content that suits the server running the request.
+
+Django streams a sync iterator under WSGI and an async one under ASGI;
+given the other kind, it logs a warning and reads the whole iterator
+into memory first. response_chunks() hands it the right kind, so a
+view's streamed downloads stream under either server.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_done = object()
+
+
+def response_chunks(request, chunks, blocking=False):
+    """
+    Returns the iterable of bytes `chunks` as StreamingHttpResponse
+    content for `request`. Pass blocking=True if producing the chunks
+    queries the database or otherwise blocks; under ASGI they are then
+    produced on a thread rather than on the event loop.
+    """
+    if not isinstance(request, ASGIRequest):
+        return chunks
+    return athread_chunks(chunks) if blocking else aiter_chunks(chunks)
+
+
+async def aiter_chunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def athread_chunks(chunks):
+    iterator = iter(chunks)
+    # thread_sensitive keeps the database connection on the one thread.
+    next_chunk = sync_to_async(lambda: next(iterator, _done))
+    while (chunk := await next_chunk()) is not _done:
+        yield chunk
@@ -0,0 +1,21 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+
+from ..static_assets import responsive_variants
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_srcset(name, fmt):
+    """
+    A srcset of the resized copies of the static image `name` in `fmt`
+    ('webp' or 'png'), or '' where there are none, as when running from
+    the source files with DEBUG on.
+
+        {% responsive_srcset 'images/hero.png' 'webp' as webp_srcset %}
+    """
+    if settings.DEBUG:
+        return ''
+    return ', '.join(f'{static(variant)} {width}w' for width, variant in responsive_variants(name, fmt))
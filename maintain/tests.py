@@ -1,3 +1,1098 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import pymupdf
+from PIL import Image
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.forms.renderers import DjangoTemplates
+from django.http import Http404, HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from fontTools.ttLib import TTFont
+from prometheus_client import REGISTRY
+
+from . import (
+    admission, checks, claims, csv_export, derived, pdf_cache, pdf_fill, pdf_jobs, profiling, session_backend,
+    static_assets, streaming, timing, zip_stream,
+)
+from .admission import Overloaded, RenderLimiter
+from .claim_data import ApplicantDetails, ApplicantIncomeAssets, ChildDetails, ClaimData, Financials
+from .form_rendering import SkeletonRenderer
+from .forms import ApplicantDetailsForm, FinancialsForm
+from .management.commands import build_fonts
+from .models import Claim
+from .pdf_payload import build_pdf_data
+from .schema import EXPENSE_PDF_ROWS, EXPENSES
+from .session_backend import SessionStore
+from .views import WIZARD_FORMS
+
+
+def read_fields(pdf_file):
+    """
+    Returns {field name: (value, flags)} for the form fields in pdf_file.
+    """
+    with pymupdf.open(stream=pdf_file, filetype='pdf') as doc:
+        return {widget.field_name: (widget.field_value, widget.field_flags) for page in doc for widget in page.widgets()}
+
+
+# Pages are rendered without a collectstatic manifest in tests.
+plain_static = override_settings(STORAGES=dict(
+    settings.STORAGES, staticfiles={'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+))
+
+
+class InMemoryRenderTests(SimpleTestCase):
+    def test_renders_the_values(self):
+        pdf_file = pdf_fill.render_j101({'1 a2': 'Ann Applicant', '1 c': '41'}, 'acroform')
+        self.assertTrue(pdf_file.startswith(b'%PDF-'))
+        fields = read_fields(pdf_file)
+        self.assertEqual(fields['1 a2'][0], 'Ann Applicant')
+        self.assertEqual(fields['1 c'][0], '41')
+
+    def test_concurrent_renders_keep_their_own_values(self):
+        names = [f'Applicant {i}' for i in range(8)]
+        results = {}
+
+        def render(name):
+            results[name] = pdf_fill.render_j101({'1 a2': name}, 'acroform')
+
+        threads = [threading.Thread(target=render, args=[name]) for name in names]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for name in names:
+            self.assertEqual(read_fields(results[name])['1 a2'][0], name)
+
+
+class ResidentTemplateTests(SimpleTestCase):
+    def test_template_is_parsed_once(self):
+        self.assertIs(pdf_fill.get_template(), pdf_fill.get_template())
+
+    def test_template_is_reparsed_when_the_file_changes(self):
+        template = pdf_fill.get_template()
+        stale = mock.Mock(mtime=template.mtime - 1)
+        with mock.patch.object(pdf_fill, '_template', stale):
+            fresh = pdf_fill.get_template()
+        self.assertIsNot(fresh, stale)
+        self.assertEqual(fresh.mtime, template.mtime)
+
+    def test_fill_is_an_incremental_update(self):
+        template = pdf_fill.get_template()
+        data = template.data
+        pdf_file = pdf_fill.render_j101({'1 a2': 'Ann Applicant'}, 'acroform')
+        # The template's bytes are shared, not rewritten, and never changed.
+        self.assertTrue(pdf_file.startswith(data))
+        self.assertEqual(template.data, data)
+        # A later render doesn't see the earlier one's values.
+        unfilled = read_fields(pdf_fill.render_j101({}, 'acroform'))['1 a2'][0]
+        self.assertEqual(unfilled, read_fields(data)['1 a2'][0])
+
+
+class CompiledFieldMapTests(SimpleTestCase):
+    def test_every_mapped_field_has_a_slot(self):
+        template = pdf_fill.get_template()
+        values = template.slot_values({'1 a2': 'Ann Applicant'})
+        self.assertEqual(len(values), len(template.widgets))
+        self.assertEqual(values[template.slots['1 a2']], 'Ann Applicant')
+        self.assertEqual(values.count(None), len(values) - 1)
+
+    def test_missing_field_fails_loudly(self):
+        with mock.patch.object(pdf_fill, 'mapped_pdf_fields', return_value=['1 a2', 'no such field']):
+            with self.assertRaisesMessage(ImproperlyConfigured, "'no such field'"):
+                pdf_fill.J101Template(pdf_fill.TEMPLATE_PATH)
+
+    def test_missing_field_is_a_system_check_error(self):
+        error = ImproperlyConfigured("J101_E_fillable.pdf has no fields named 'x'.")
+        with mock.patch.object(pdf_fill, 'get_template', side_effect=error):
+            errors = checks.check_pdf_field_map(None)
+        self.assertEqual([e.id for e in errors], ['maintain.E002'])
+
+
+class PdfEngineTests(SimpleTestCase):
+    def test_pymupdf_engine_flattens(self):
+        pdf_file = pdf_fill.render_j101({'1 a2': 'Ann Applicant'}, 'pymupdf')
+        self.assertEqual(read_fields(pdf_file), {})
+        with pymupdf.open(stream=pdf_file, filetype='pdf') as doc:
+            self.assertFalse(doc.is_form_pdf)
+            self.assertIn('Ann Applicant', doc[0].get_text())
+        self.assertLess(len(pdf_file), len(pdf_fill.get_template().data))
+
+    def test_acroform_engine_locks_the_fields(self):
+        fields = read_fields(pdf_fill.render_j101({'1 a2': 'Ann Applicant'}, 'acroform'))
+        self.assertEqual(fields['1 a2'][0], 'Ann Applicant')
+        for value, flags in fields.values():
+            self.assertTrue(flags & pdf_fill.READ_ONLY_FLAG)
+
+    @override_settings(PDF_ENGINE='acroform')
+    def test_engine_setting(self):
+        self.assertIn('1 a2', read_fields(pdf_fill.render_j101({'1 a2': 'Ann Applicant'})))
+
+    @override_settings(PDF_ENGINE='pdftk')
+    def test_unknown_engine_is_a_system_check_error(self):
+        self.assertEqual([e.id for e in checks.check_pdf_field_map(None)], ['maintain.E003'])
+
+
+@mock.patch('maintain.pdf_cache._cache', None)
+class PdfJobTests(TestCase):
+    def setUp(self):
+        job_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(job_dir.cleanup)
+        self.enterContext(override_settings(PDF_JOB_DIR=job_dir.name))
+        self.client.get('/dev-autofill/')
+
+    def finished_job(self):
+        response = self.client.post('/generate_pdf/jobs/')
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()['status_url']
+        deadline = time.monotonic() + 30
+        while (status := self.client.get(status_url).json())['status'] == pdf_jobs.PENDING:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+        return status
+
+    def test_download_deletes_the_pdf(self):
+        status = self.finished_job()
+        self.assertEqual(status['status'], pdf_jobs.DONE)
+        response = self.client.get(status['download_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF-'))
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(os.listdir(settings.PDF_JOB_DIR), [])
+        self.assertEqual(self.client.get(status['download_url']).status_code, 404)
+
+    def test_only_the_submitting_session_sees_the_job(self):
+        status = self.finished_job()
+        self.client.logout()
+        self.assertEqual(self.client.get(status['download_url']).status_code, 404)
+
+    def test_failed_render(self):
+        with mock.patch('maintain.pdf_cache.render_j101', side_effect=RuntimeError('boom')):
+            with self.assertLogs('maintain.pdf_jobs', 'ERROR'):
+                pdf_jobs.run_job('job', {})
+        self.assertEqual(pdf_jobs.status('job'), pdf_jobs.FAILED)
+        self.assertIsNone(pdf_jobs.result('job'))
+
+    def test_clearpdfjobs_deletes_expired_jobs(self):
+        pdf_jobs.write_atomic(pdf_jobs.job_path('old', 'pdf'), b'%PDF-')
+        pdf_jobs.write_atomic(pdf_jobs.job_path('new', 'pdf'), b'%PDF-')
+        expired = time.time() - settings.PDF_JOB_TTL - 1
+        os.utime(pdf_jobs.job_path('old', 'pdf'), (expired, expired))
+        call_command('clearpdfjobs', verbosity=0)
+        self.assertIsNone(pdf_jobs.status('old'))
+        self.assertEqual(pdf_jobs.status('new'), pdf_jobs.DONE)
+
+
+class RenderCacheTests(SimpleTestCase):
+    def test_key_depends_on_payload_and_engine(self):
+        key = pdf_cache.cache_key({'1 a2': 'Ann', '1 c': '41'}, 'pymupdf')
+        self.assertEqual(key, pdf_cache.cache_key({'1 c': '41', '1 a2': 'Ann'}, 'pymupdf'))
+        self.assertNotEqual(key, pdf_cache.cache_key({'1 a2': 'Ann', '1 c': '42'}, 'pymupdf'))
+        self.assertNotEqual(key, pdf_cache.cache_key({'1 a2': 'Ann', '1 c': '41'}, 'acroform'))
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        cache = pdf_cache.RenderCache(max_bytes=10)
+        cache.put('a', b'aaaa')
+        cache.put('b', b'bbbb')
+        cache.get('a')
+        cache.put('c', b'cccc')
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (b'aaaa', None, b'cccc'))
+        # Entries bigger than the whole tier aren't kept.
+        cache.put('d', b'd' * 11)
+        self.assertIsNone(cache.get('d'))
+
+    def test_disk_tier_is_shared_and_expires(self):
+        with tempfile.TemporaryDirectory() as directory:
+            pdf_cache.RenderCache(max_bytes=100, directory=directory, ttl=60).put('a', b'%PDF-')
+            other_process = pdf_cache.RenderCache(max_bytes=100, directory=directory, ttl=60)
+            self.assertEqual(other_process.get('a'), b'%PDF-')
+
+            expired = time.time() - 61
+            os.utime(os.path.join(directory, 'a.pdf'), (expired, expired))
+            self.assertIsNone(pdf_cache.RenderCache(max_bytes=100, directory=directory, ttl=60).get('a'))
+
+    @mock.patch('maintain.pdf_cache._cache', None)
+    def test_identical_payloads_render_once(self):
+        with mock.patch.object(pdf_fill, 'render_j101', return_value=b'%PDF-') as render:
+            pdf_cache.render_j101({'1 a2': 'Ann'})
+            pdf_cache.render_j101({'1 a2': 'Ann'})
+            pdf_cache.render_j101({'1 a2': 'Bob'})
+        self.assertEqual(render.call_count, 2)
+
+    @mock.patch('maintain.pdf_cache._cache', None)
+    async def test_async_render_shares_the_cache(self):
+        with mock.patch.object(pdf_fill, 'render_j101', return_value=b'%PDF-') as render:
+            self.assertEqual(await pdf_cache.arender_j101({'1 a2': 'Ann'}), b'%PDF-')
+            self.assertEqual(pdf_cache.render_j101({'1 a2': 'Ann'}), b'%PDF-')
+        self.assertEqual(render.call_count, 1)
+
+
+@mock.patch('maintain.pdf_cache._cache', None)
+class GeneratePdfTests(TestCase):
+    def setUp(self):
+        self.client.get('/dev-autofill/')
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get('/generate_pdf/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        etag = response['ETag']
+
+        response = self.client.get('/generate_pdf/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_changed_answers_change_the_etag(self):
+        etag = self.client.get('/generate_pdf/')['ETag']
+        self.client.post(
+            '/start/autosave/', json.dumps({'step': 'financials', 'fields': {'self_lodging': '4100'}}),
+            content_type='application/json',
+        )
+        response = self.client.get('/generate_pdf/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class PdfPayloadTests(SimpleTestCase):
+    def test_applicant_and_derived_fields(self):
+        claim_data = ClaimData(
+            applicant_details=ApplicantDetails(
+                full_name='Ann Applicant', id_number='8501155180085', contact_phone='082 123 4567',
+                residential_address='1 Main Road', postal_code='8001',
+            ),
+            applicant_income_assets=ApplicantIncomeAssets(
+                gross_salary=Decimal('25000'), tax=Decimal('5000'), savings=Decimal('0'),
+            ),
+        )
+        pdf_data = build_pdf_data(claim_data, today=date(2026, 1, 1))
+        self.assertEqual(pdf_data['1 a2'], 'Ann Applicant')
+        self.assertEqual(pdf_data['1 c'], '40')
+        self.assertEqual(pdf_data['1 e1'], '1 Main Road, 8001')
+        self.assertEqual((pdf_data['1 e6'], pdf_data['1 e7']), ('082', '1234567'))
+        # Dates of birth and ID numbers are written a character per box.
+        self.assertEqual(''.join(pdf_data[f'1 b{i}'] for i in range(1, 7)), '150185')
+        self.assertEqual(''.join(pdf_data[f'1 d{i}'] for i in range(1, 14)), '8501155180085')
+        self.assertEqual(pdf_data['gross'], '25000.00')
+        self.assertEqual(pdf_data['nett'], '20000.00')
+        # Zero amounts are left blank.
+        self.assertNotIn('3 A3', pdf_data)
+
+    def test_maintenance_is_split_between_the_children(self):
+        claim_data = ClaimData(
+            child_details=[ChildDetails(full_name='A', date_of_birth=date(2018, 11, 22)), ChildDetails(full_name='B')],
+            financials=Financials(total_maintenance_claimed=Decimal('3000')),
+        )
+        pdf_data = build_pdf_data(claim_data, today=date(2026, 1, 1))
+        self.assertEqual(pdf_data['2 D1'], '3000.00')
+        self.assertEqual((pdf_data['2 D2'], pdf_data['2 D3']), ('1500.00', 'A'))
+        self.assertEqual((pdf_data['2 E2'], pdf_data['2 E3']), ('1500.00', 'B'))
+        self.assertEqual(''.join(pdf_data[f'2 D 4{c}'] for c in 'abcdefgh'), '22112018')
+        self.assertEqual(''.join(pdf_data[f'2 E 4{c}'] for c in 'abcdefgh'), '--------')
+        self.assertNotIn('2 F3', pdf_data)
+
+    def test_empty_claim(self):
+        pdf_data = build_pdf_data(ClaimData(), today=date(2026, 1, 1))
+        self.assertNotIn('1 a2', pdf_data)
+        self.assertEqual(pdf_data['2 D1'], '0.00')
+
+
+class GenerateJ101CommandTests(SimpleTestCase):
+    def run_command(self, lines, output, *args):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        input_path = os.path.join(directory.name, 'claims.jsonl')
+        with open(input_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        stdout, stderr = io.StringIO(), io.StringIO()
+        output_path = os.path.join(directory.name, output)
+        call_command('generate_j101', input_path, output_path, '--workers=1', *args, stdout=stdout, stderr=stderr)
+        return output_path, stdout.getvalue(), stderr.getvalue()
+
+    def test_renders_each_claim_and_skips_bad_lines(self):
+        claim = ClaimData(applicant_details=ApplicantDetails(full_name='Ann Applicant'))
+        lines = [json.dumps(claim.to_wizard_data()), '', 'not json', '[1, 2]']
+        output_path, stdout, stderr = self.run_command(lines, 'out.zip')
+        with zipfile.ZipFile(output_path) as archive:
+            self.assertEqual(archive.namelist(), ['000001_ann-applicant.pdf'])
+            self.assertTrue(archive.read('000001_ann-applicant.pdf').startswith(b'%PDF-'))
+        self.assertIn('Rendered 1 PDF(s)', stdout)
+        self.assertIn('2 record(s) skipped', stdout)
+        self.assertIn('Line 3: skipped', stderr)
+        self.assertIn('Line 4: skipped (ValueError: expected a JSON object, got list)', stderr)
+
+    def test_writes_to_a_directory(self):
+        output_path, stdout, _ = self.run_command(['{}', '{}'], 'out', '--progress-every=1')
+        self.assertEqual(sorted(os.listdir(output_path)), ['000001_claim.pdf', '000002_claim.pdf'])
+        self.assertIn('2 processed, 0 skipped', stdout)
+
+    def test_rejects_bad_options(self):
+        for option in ('--workers=0', '--progress-every=0'):
+            with self.subTest(option), self.assertRaises(CommandError):
+                call_command('generate_j101', '-', 'out', option)
+
+
+class ZipStreamTests(SimpleTestCase):
+    def test_stream_is_a_valid_archive(self):
+        data = bytes(range(256)) * 1000
+        entries = [
+            ('a.bin', zip_stream.iter_chunks(data, size=4096), False),
+            ('b.txt', [b'hello ', b'world'], True),
+            ('empty.txt', [], True),
+        ]
+        chunks = list(zip_stream.stream_zip(entries))
+        # Nothing is held back until the end: each chunk of an entry is passed on.
+        self.assertGreater(len(chunks), len(data) // 4096)
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.read('a.bin'), data)
+            self.assertEqual(archive.read('b.txt'), b'hello world')
+            self.assertEqual(archive.read('empty.txt'), b'')
+            self.assertEqual(archive.getinfo('a.bin').compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(archive.getinfo('b.txt').compress_type, zipfile.ZIP_DEFLATED)
+
+
+@mock.patch('maintain.pdf_cache._cache', None)
+class DownloadBundleTests(TestCase):
+    def test_bundle(self):
+        self.client.get('/dev-autofill/')
+        response = self.client.get('/download-bundle/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('no-cache', response['Cache-Control'])
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            names = archive.namelist()
+            self.assertEqual(names[1:], ['maintenance_application_summary.csv', 'documents_checklist.txt'])
+            self.assertTrue(archive.read(names[0]).startswith(b'%PDF-'))
+            self.assertIn(b'[ ] ', archive.read('documents_checklist.txt'))
+
+    def test_no_claim_redirects(self):
+        self.assertRedirects(self.client.get('/download-bundle/'), '/start/', fetch_redirect_response=False)
+
+
+def read_csv(chunks):
+    return list(csv.reader(b''.join(chunks).decode('utf-8').splitlines()))
+
+
+class CsvExportTests(SimpleTestCase):
+    claim_data = ClaimData(
+        applicant_details=ApplicantDetails(full_name='Ann Applicant'),
+        child_details=[ChildDetails(full_name='A', date_of_birth=date(2018, 11, 22))],
+        financials=Financials(self_lodging=Decimal('4000.00')),
+    )
+
+    def test_long_layout(self):
+        rows = read_csv(csv_export.iter_csv(csv_export.summary_csv_rows(self.claim_data)))
+        self.assertEqual(rows[0], ['Section', 'Question', 'Answer'])
+        self.assertIn(['Applicant Details', 'full_name', 'Ann Applicant'], rows)
+        self.assertIn(['Child Details 1', 'date_of_birth', '2018-11-22'], rows)
+        self.assertIn(['Financials', 'self_lodging', '4000.00'], rows)
+
+    def test_wide_layout(self):
+        columns = csv_export.wide_columns(WIZARD_FORMS)
+        header, row = read_csv(csv_export.iter_csv(csv_export.wide_csv_rows([self.claim_data], columns)))
+        self.assertEqual(len(header), len(row))
+        self.assertNotIn('applicant_details.form_step', header)
+        answers = dict(zip(header, row))
+        self.assertEqual(answers['applicant_details.full_name'], 'Ann Applicant')
+        self.assertEqual(answers['child_details.1.full_name'], 'A')
+        self.assertEqual(answers[f'child_details.{csv_export.MAX_CHILDREN}.full_name'], '')
+        self.assertEqual(answers['financials.self_lodging'], '4000.00')
+        self.assertEqual(answers['respondent_details.full_name'], '')
+
+
+class CsvViewTests(TestCase):
+    def test_summary_download(self):
+        self.client.get('/dev-autofill/')
+        response = self.client.get('/download-summary/')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(read_csv(response.streaming_content)[0], ['Section', 'Question', 'Answer'])
+        response = self.client.get('/download-summary/?layout=wide')
+        self.assertEqual(len(read_csv(response.streaming_content)), 2)
+
+    def test_claims_export_is_for_staff(self):
+        self.assertEqual(self.client.get('/export/claims.csv').status_code, 302)
+        Claim.save_step('a', 'applicant_details', {'full_name': 'Ann Applicant'})
+        Claim.save_step('b', 'applicant_details', {'full_name': 'Bob Applicant'})
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        rows = read_csv(self.client.get('/export/claims.csv').streaming_content)
+        names = [row[rows[0].index('applicant_details.full_name')] for row in rows[1:]]
+        self.assertEqual(names, ['Ann Applicant', 'Bob Applicant'])
+
+
+@plain_static
+class ClaimModelTests(TestCase):
+    def test_save_step_writes_one_column(self):
+        Claim.save_step('token', 'applicant_details', {'full_name': 'Ann Applicant'})
+        Claim.save_step('token', 'financials', {'self_lodging': '4000.00'})
+        Claim.save_step('token', 'applicant_details', {'full_name': 'Ann Other'})
+        claim = Claim.objects.get()
+        self.assertEqual(claim.applicant_details, {'full_name': 'Ann Other'})
+        self.assertEqual(claim.financials, {'self_lodging': '4000.00'})
+        self.assertIsNone(claim.respondent_details)
+        self.assertEqual(claim.claim_data.applicant_details.full_name, 'Ann Other')
+
+    def test_unknown_step(self):
+        with self.assertRaises(ValueError):
+            Claim.save_step('token', 'memo', {})
+
+    def test_legacy_session_answers_move_to_a_claim(self):
+        session = self.client.session
+        session[claims.LEGACY_SESSION_KEY] = ClaimData(
+            applicant_details=ApplicantDetails(full_name='Ann Applicant'),
+        ).to_wizard_data()
+        session.save()
+        self.client.get('/summary/')
+        self.assertNotIn(claims.LEGACY_SESSION_KEY, self.client.session)
+        claim = Claim.objects.get(token=self.client.session[claims.SESSION_KEY])
+        self.assertEqual(claim.applicant_details['full_name'], 'Ann Applicant')
+
+    def test_resume_link(self):
+        Claim.save_step('token', 'applicant_details', {'full_name': 'Ann Applicant'})
+        self.assertEqual(self.client.get('/resume/other/').status_code, 404)
+        self.assertRedirects(self.client.get('/resume/token/'), '/start/', fetch_redirect_response=False)
+        self.assertEqual(self.client.session[claims.SESSION_KEY], 'token')
+
+    def test_clearclaims_deletes_stale_claims(self):
+        Claim.save_step('old', 'applicant_details', {'full_name': 'Ann Applicant'})
+        Claim.save_step('new', 'applicant_details', {'full_name': 'Bob Applicant'})
+        Claim.objects.filter(token='old').update(
+            updated_at=timezone.now() - timedelta(seconds=settings.CLAIM_RETENTION + 1),
+        )
+        call_command('clearclaims', verbosity=0)
+        self.assertEqual(list(Claim.objects.values_list('token', flat=True)), ['new'])
+
+    @override_settings(CLAIM_RETENTION=7 * 24 * 3600)
+    def test_downloads_page_states_the_retention(self):
+        self.assertContains(self.client.get('/downloads/'), 'deleted automatically 7 days after your last change')
+
+
+class SessionSaveTests(TestCase):
+    def stored_session(self):
+        session = SessionStore()
+        session['current_step'] = 'financials'
+        session.save()
+        session = SessionStore(session.session_key)
+        session.load()
+        return session
+
+    def test_unchanged_session_is_not_written(self):
+        session = self.stored_session()
+        session['current_step'] = 'financials'
+        self.assertTrue(session.modified)
+        with self.assertNumQueries(0):
+            session.save()
+
+    def test_changed_session_is_written(self):
+        session = self.stored_session()
+        session['current_step'] = 'child_details'
+        session.save()
+        self.assertEqual(SessionStore(session.session_key)['current_step'], 'child_details')
+
+    def test_session_is_refreshed_daily(self):
+        session = self.stored_session()
+        tomorrow = date.fromordinal(date.today().toordinal() + 1)
+        with mock.patch.object(session_backend, 'date', wraps=date) as mock_date:
+            mock_date.today.return_value = tomorrow
+            session.save()
+        session = SessionStore(session.session_key)
+        self.assertEqual(session[session_backend.REFRESHED_KEY], tomorrow.toordinal())
+
+    async def test_async_save_skips_unchanged_session(self):
+        session = SessionStore()
+        await session.aset('current_step', 'financials')
+        await session.asave()
+        session = SessionStore(session.session_key)
+        await session.aload()
+        await session.aset('current_step', 'financials')
+        with mock.patch('django.contrib.sessions.backends.cached_db.SessionStore.asave') as asave:
+            await session.asave()
+        asave.assert_not_called()
+
+
+class ClaimCodecTests(SimpleTestCase):
+    def test_record_round_trip(self):
+        record = ApplicantIncomeAssets(gross_salary=Decimal('25000.50'), savings=Decimal('0.00'))
+        encoded = json.loads(json.dumps(record.encode()))
+        self.assertEqual(encoded, {'gross_salary': '25000.50', 'savings': '0.00'})
+        decoded = ApplicantIncomeAssets.decode(encoded)
+        self.assertEqual(decoded, record)
+        self.assertIsInstance(decoded.gross_salary, Decimal)
+        self.assertIsNone(decoded.tax)
+
+    def test_dates_round_trip(self):
+        child = ChildDetails(full_name='Thabo', date_of_birth=date(2015, 6, 10))
+        self.assertEqual(ChildDetails.decode(json.loads(json.dumps(child.encode()))), child)
+
+    def test_legacy_strings_decode_to_types(self):
+        decoded = ApplicantIncomeAssets.decode({'gross_salary': '1000.5', 'tax': ''})
+        self.assertEqual(decoded.gross_salary, Decimal('1000.5'))
+        self.assertIsNone(decoded.tax)
+
+    def test_claim_round_trip(self):
+        claim_data = ClaimData(
+            child_details=[ChildDetails(full_name='A', date_of_birth=date(2018, 11, 22)), ChildDetails(full_name='B')],
+            financials=Financials(self_lodging=Decimal('4000.00'), date_not_supported=date(2024, 1, 1)),
+        )
+        restored = ClaimData.from_wizard_data(json.loads(json.dumps(claim_data.to_wizard_data())))
+        self.assertEqual(restored.completed_steps(), ['child_details', 'financials'])
+        for step_name in ClaimData.STEPS:
+            self.assertEqual(getattr(restored, step_name), getattr(claim_data, step_name))
+            self.assertEqual(restored.step_hash(step_name), claim_data.step_hash(step_name))
+    def test_records_are_slotted(self):
+        record = Financials(self_lodging=Decimal('1'))
+        self.assertFalse(hasattr(record, '__dict__'))
+        with self.assertRaises(AttributeError):
+            record.not_a_field = 1
+        self.assertEqual(record.replace(self_lodging=''), Financials())
+
+
+class SchemaPdfMappingTests(SimpleTestCase):
+    def test_expense_rows(self):
+        rows = {row[1]: row for row in EXPENSE_PDF_ROWS}
+        self.assertEqual(rows['child_lodging'], ('self_lodging', 'child_lodging', '3 C 1', '3 D 1', '3 E 1'))
+        # Children-only categories have no self column.
+        self.assertEqual(rows['child_school_fees'], (None, 'child_school_fees', None, '3 D 20', '3 E 20'))
+        # Rows 55-59 start with a description column.
+        self.assertEqual(rows['child_other'], ('self_other', 'child_other', '3 D 55', '3 E 55', '3 F 55'))
+        self.assertEqual(len(rows), len(EXPENSES))
+
+    def test_expense_fields_are_on_the_form(self):
+        for self_field, child_field, *_ in EXPENSE_PDF_ROWS:
+            for field in filter(None, (self_field, child_field)):
+                self.assertIn(field, Financials.FORM_CLASS.base_fields)
+
+    def test_every_mapped_field_is_in_the_template(self):
+        self.assertEqual(checks.check_pdf_field_map(None), [])
+
+    def test_expenses_fill_their_rows(self):
+        claim_data = ClaimData(financials=Financials(
+            self_lodging=Decimal('4000'), child_lodging=Decimal('1000'), child_school_fees=Decimal('500'),
+        ))
+        pdf_data = build_pdf_data(claim_data, today=date(2026, 1, 1))
+        self.assertEqual(pdf_data['3 C 1'], '4000.00')
+        self.assertEqual(pdf_data['3 D 1'], '1000.00')
+        self.assertEqual(pdf_data['3 E 1'], '5000.00')
+        self.assertEqual(pdf_data['3 D 20'], '500.00')
+        self.assertEqual(pdf_data['3 E 20'], '500.00')
+        # Column totals.
+        self.assertEqual(pdf_data['3 D 60'], '4000.00')
+        self.assertEqual(pdf_data['3 E 60'], '1500.00')
+        self.assertEqual(pdf_data['3 F 60'], '5500.00')
+        # Categories with no amount stay blank.
+        self.assertNotIn('3 C 2', pdf_data)
+        self.assertNotIn('3 E 2', pdf_data)
+
+
+@plain_static
+class AutosaveTests(TestCase):
+    def patch(self, step, fields):
+        response = self.client.post(
+            '/start/autosave/', json.dumps({'step': step, 'fields': fields}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def claim_data(self):
+        return Claim.objects.get(token=self.client.session[claims.SESSION_KEY]).claim_data
+
+    def test_patches_merge(self):
+        self.patch('applicant_details', {'full_name': 'Ann Applicant'})
+        self.patch('applicant_details', {'id_number': '8501155180085'})
+        applicant = self.claim_data().applicant_details
+        self.assertEqual((applicant.full_name, applicant.id_number), ('Ann Applicant', '8501155180085'))
+
+    def test_invalid_value_is_not_saved(self):
+        self.patch('financials', {'self_lodging': '4000'})
+        result = self.patch('financials', {'self_lodging': 'lots', 'child_lodging': '1000'})
+        self.assertEqual(result['saved'], ['child_lodging'])
+        self.assertIn('self_lodging', result['errors'])
+        financials = self.claim_data().financials
+        self.assertEqual((financials.self_lodging, financials.child_lodging), (Decimal('4000'), Decimal('1000')))
+
+    def test_list_index_bounds(self):
+        result = self.patch('child_details', {'child_details-999-full_name': 'X'})
+        self.assertEqual(result['saved'], [])
+        self.assertFalse(Claim.objects.exists())
+
+        self.patch('child_details', {'child_details-0-full_name': 'A'})
+        result = self.patch('child_details', {'child_details-2-full_name': 'C'})
+        self.assertEqual(result['saved'], [])
+        self.patch('child_details', {'child_details-1-full_name': 'B'})
+        self.assertEqual([child.full_name for child in self.claim_data().child_details], ['A', 'B'])
+
+    def test_patch_step_refuses_gaps(self):
+        self.patch('child_details', {'child_details-0-full_name': 'A'})
+        request = mock.Mock(session=self.client.session)
+        with self.assertRaises(ValueError):
+            claims.patch_step(request, 'child_details', {3: {'full_name': 'D'}}, self.claim_data())
+
+    def test_autosaved_steps_are_not_completed(self):
+        self.patch('applicant_details', {'full_name': 'Ann Applicant'})
+        self.patch('financials', {'self_lodging': '4000'})
+        response = self.client.get('/start/?step=financials')
+        self.assertEqual(response['X-Wizard-Step'], 'applicant_details')
+        self.assertRedirects(self.client.get('/generate_pdf/'), '/summary/')
+    def test_malformed_patches_are_rejected(self):
+        for body in ('not json', '[]', '{"step": "financials"}', '{"step": ["x"], "fields": {}}',
+                     '{"step": "financials", "fields": []}', '{"step": "nope", "fields": {}}'):
+            with self.subTest(body):
+                response = self.client.post('/start/autosave/', body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+
+@plain_static
+class WizardFragmentTests(TestCase):
+    fragment = {'X-Wizard-Fragment': '1'}
+
+    def test_fragment_is_just_the_step(self):
+        page = self.client.get('/start/')
+        fragment = self.client.get('/start/', headers=self.fragment)
+        self.assertContains(page, '<html')
+        self.assertNotContains(fragment, '<html')
+        self.assertContains(fragment, 'data-wizard-title')
+        self.assertIn('X-Wizard-Fragment', fragment['Vary'])
+        self.assertEqual(fragment['X-Wizard-Step'], 'applicant_details')
+
+    def test_valid_step_answers_with_the_next_one(self):
+        response = self.client.post('/start/', {
+            'form_step': 'applicant_details', 'full_name': 'Ann Applicant', 'id_number': '8501155180085',
+            'residential_address': '1 Main Road', 'contact_phone': '0821234567',
+        }, headers=self.fragment)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Wizard-Step'], 'respondent_details')
+        self.assertNotContains(response, '<html')
+
+    def test_last_step_sends_the_script_to_the_summary(self):
+        self.client.get('/dev-autofill/')
+        financials = Claim.objects.get(token=self.client.session[claims.SESSION_KEY]).financials
+        response = self.client.post('/start/', dict(financials, form_step='financials'), headers=self.fragment)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['X-Wizard-Redirect'], '/summary/')
+
+
+class SkeletonRendererTests(SimpleTestCase):
+    def assertSameMarkup(self, form_class, data=None, **kwargs):
+        renderer = SkeletonRenderer()
+        for _ in range(2):
+            # The second round is rendered from the skeletons the first one kept.
+            skeleton_form = form_class(data, renderer=renderer, **kwargs)
+            plain_form = form_class(data, renderer=DjangoTemplates(), **kwargs)
+            for name in plain_form.fields:
+                self.assertEqual(str(skeleton_form[name]), str(plain_form[name]))
+        return renderer
+
+    def test_matches_the_default_renderer(self):
+        self.assertSameMarkup(ApplicantDetailsForm)
+        self.assertSameMarkup(ApplicantDetailsForm, initial={'full_name': 'Ann <b>"Applicant"</b> & co'})
+        self.assertSameMarkup(FinancialsForm, initial={'self_lodging': '4000.00'})
+
+    def test_matches_with_errors(self):
+        # An invalid form: some fields get aria-invalid.
+        self.assertSameMarkup(ApplicantDetailsForm, {'full_name': '<script>', 'id_number': 'x' * 20})
+
+    def test_skeletons_are_reused(self):
+        renderer = self.assertSameMarkup(ApplicantDetailsForm, initial={'full_name': 'Ann'})
+        count = len(renderer.skeletons)
+        self.assertGreater(count, 0)
+        str(ApplicantDetailsForm(initial={'full_name': 'Bob'}, renderer=renderer)['full_name'])
+        self.assertEqual(len(renderer.skeletons), count)
+
+
+class ClaimMemoTests(SimpleTestCase):
+    request = mock.Mock(session={})
+
+    def claim_data(self):
+        return ClaimData(
+            applicant_details=ApplicantDetails(
+                full_name='Ann Applicant', id_number='8501155180085', residential_address='1 Main Road',
+                contact_phone='0821234567',
+            ),
+            applicant_income_assets=ApplicantIncomeAssets(gross_salary=Decimal('25000'), tax=Decimal('5000')),
+        )
+
+    def test_validation_is_memoised(self):
+        claim_data = self.claim_data()
+        with mock.patch.object(claims, 'bound_step_form', wraps=claims.bound_step_form) as bound_step_form:
+            self.assertEqual(claims.validate_steps(self.request, claim_data), {})
+            self.assertEqual(bound_step_form.call_count, 2)
+            self.assertEqual(claims.validated_steps(claim_data), ['applicant_details', 'applicant_income_assets'])
+            claims.validate_steps(self.request, claim_data)
+            self.assertEqual(bound_step_form.call_count, 2)
+
+            # Changed answers are checked again, and stop counting as validated.
+            claim_data.applicant_details = claim_data.applicant_details.replace(full_name='')
+            self.assertEqual(claims.validated_steps(claim_data), ['applicant_income_assets'])
+            invalid = claims.validate_steps(self.request, claim_data)
+            self.assertEqual(bound_step_form.call_count, 3)
+        self.assertEqual(list(invalid), ['applicant_details'])
+        self.assertIn('What is your full name? — This field is required.', invalid['applicant_details'])
+
+    def test_derived_values_are_memoised(self):
+        claim_data = self.claim_data()
+        today = date(2026, 1, 1)
+        with mock.patch.object(derived, 'compute', wraps=derived.compute) as compute:
+            values = claims.derived_values(self.request, claim_data, today)
+            self.assertEqual(claims.derived_values(self.request, claim_data, today), values)
+            self.assertEqual(compute.call_count, 1)
+            # A new day, or new answers, means new ages and totals.
+            claims.derived_values(self.request, claim_data, date(2026, 1, 2))
+            claim_data.applicant_income_assets = claim_data.applicant_income_assets.replace(tax=Decimal('6000'))
+            values = claims.derived_values(self.request, claim_data, date(2026, 1, 2))
+            self.assertEqual(compute.call_count, 3)
+        self.assertEqual((values.applicant_age, values.nett_salary), ('40', Decimal('19000')))
+
+
+class StaticAssetTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source = os.path.join(directory.name, 'source')
+        os.makedirs(os.path.join(source, 'images'))
+        os.makedirs(os.path.join(source, 'css'))
+        Image.new('RGB', (1000, 20), 'teal').save(os.path.join(source, 'images', 'hero.png'))
+        with open(os.path.join(source, 'css', 'site.css'), 'w') as f:
+            f.write('body { color: teal; }\n' * 100)
+        self.enterContext(override_settings(
+            STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATIC_ROOT=os.path.join(directory.name, 'root'),
+        ))
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_images_get_resized_copies(self):
+        webp = static_assets.responsive_variants('images/hero.png', 'webp')
+        self.assertEqual([width for width, _ in webp], [480, 960, 1000])
+        self.assertEqual(webp[0][1], 'images/hero-480w.webp')
+        with staticfiles_storage.open(staticfiles_storage.stored_name(webp[0][1])) as f:
+            self.assertEqual(Image.open(f).size, (480, 10))
+
+        srcset = Template(
+            "{% load static_assets %}{% responsive_srcset 'images/hero.png' 'png' %}"
+        ).render(Context())
+        self.assertRegex(srcset, r'^/static/images/hero-480w\.\w+\.png 480w, ')
+
+    def test_hashed_text_files_are_served_gzipped(self):
+        hashed = staticfiles_storage.stored_name('css/site.css')
+        request = RequestFactory().get('/', headers={'Accept-Encoding': 'gzip'})
+        response = static_assets.serve(request, hashed)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Cache-Control'], static_assets.IMMUTABLE_CACHE_CONTROL)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'body { color: teal; }\n' * 100)
+
+        response = static_assets.serve(RequestFactory().get('/'), 'css/site.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Cache-Control'], static_assets.DEFAULT_CACHE_CONTROL)
+
+        with self.assertRaises(Http404):
+            static_assets.serve(request, f'{hashed}.gz')
+
+
+class BuildFontsTests(SimpleTestCase):
+    def test_finds_template_icons(self):
+        names = build_fonts.template_icon_names()
+        self.assertIn('download', names)
+        self.assertIn('lock', names)
+        self.assertEqual(names, sorted(set(names)))
+
+    def test_subset_keeps_only_the_named_icons(self):
+        source = build_fonts.FONT_DIR / build_fonts.ICON_SOURCE
+        woff2 = build_fonts.subset_icon_font(source, ['download', 'lock'])
+        self.assertLess(len(woff2), source.stat().st_size / 10)
+        subset = io.BytesIO(woff2)
+        self.assertEqual(TTFont(subset).flavor, 'woff2')
+        subset.name = source.name
+        build_fonts.subset_icon_font(subset, ['download', 'lock'])
+        with self.assertRaisesMessage(CommandError, 'no icon named info'):
+            build_fonts.subset_icon_font(subset, ['download', 'info'])
+
+    def test_checked_in_fonts_are_up_to_date(self):
+        # Fails when a template uses an icon and build_fonts wasn't re-run.
+        build_fonts.subset_icon_font(build_fonts.FONT_DIR / build_fonts.ICON_SUBSET, build_fonts.template_icon_names())
+        css = build_fonts.CSS_PATH.read_text(encoding='utf-8')
+        for file in re.findall(r"url\('\.\./fonts/([^']+)'\)", css):
+            self.assertTrue((build_fonts.FONT_DIR / file).is_file(), file)
+
+
+class RenderLimiterTests(SimpleTestCase):
+    def acquire_in_thread(self, limiter):
+        errors = []
+
+        def acquire():
+            try:
+                limiter.acquire()
+            except Overloaded as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        return thread, errors
+
+    def test_rejects_when_queue_is_full(self):
+        limiter = RenderLimiter(max_active=1, max_waiting=0, timeout=1, retry_after=7)
+        with limiter.slot():
+            with self.assertRaises(Overloaded) as cm:
+                limiter.acquire()
+        self.assertEqual(cm.exception.retry_after, 7)
+        self.assertEqual(limiter.stats(), {
+            'admitted': 1, 'queued': 0, 'rejected': 1, 'timed_out': 0, 'active': 0, 'waiting': 0,
+        })
+
+    def test_times_out_waiting(self):
+        limiter = RenderLimiter(max_active=1, max_waiting=1, timeout=0.05, retry_after=1)
+        with limiter.slot():
+            thread, errors = self.acquire_in_thread(limiter)
+            thread.join()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(limiter.stats()['timed_out'], 1)
+
+    def test_waiter_is_admitted_on_release(self):
+        limiter = RenderLimiter(max_active=1, max_waiting=1, timeout=5, retry_after=1)
+        limiter.acquire()
+        thread, errors = self.acquire_in_thread(limiter)
+        while limiter.stats()['waiting'] == 0:
+            thread.join(0.01)
+        limiter.release()
+        thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(limiter.stats()['admitted'], 2)
+        limiter.release()
+
+@mock.patch('maintain.pdf_cache._cache', None)
+class RenderAdmissionTests(TestCase):
+    def setUp(self):
+        self.client.get('/dev-autofill/')
+        self.limiter = RenderLimiter(max_active=1, max_waiting=0, timeout=1, retry_after=5)
+        self.enterContext(mock.patch.object(admission, 'get_limiter', return_value=self.limiter))
+
+    def test_overloaded_render_is_a_503(self):
+        self.limiter.acquire()
+        response = self.client.get('/generate_pdf/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertIn('no-store', response['Cache-Control'])
+
+    def test_cached_pdf_skips_the_limiter(self):
+        self.client.get('/generate_pdf/')
+        self.limiter.acquire()
+        self.assertEqual(self.client.get('/generate_pdf/').status_code, 200)
+
+    def test_pdf_jobs_hold_a_slot(self):
+        job_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(job_dir.cleanup)
+        self.enterContext(override_settings(PDF_JOB_DIR=job_dir.name))
+        rendering = threading.Event()
+
+        def render(pdf_data):
+            rendering.wait(5)
+            return b'%PDF-'
+
+        with mock.patch.object(pdf_fill, 'render_j101', side_effect=render):
+            self.assertEqual(self.client.post('/generate_pdf/jobs/').status_code, 202)
+            response = self.client.post('/generate_pdf/jobs/')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '5')
+            rendering.set()
+            while self.limiter.stats()['active']:
+                time.sleep(0.01)
+        self.assertEqual(self.limiter.stats()['admitted'], 1)
+
+
+class RenderPoolTests(SimpleTestCase):
+    def test_backlog_is_bounded(self):
+        release = threading.Event()
+        executor = pdf_fill.BoundedExecutor(max_workers=1, max_queued=1)
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(release.set)
+        running = executor.submit(release.wait)
+        executor.submit(release.wait)
+        with self.assertRaises(Overloaded):
+            executor.submit(release.wait)
+        release.set()
+        running.result()
+
+    @override_settings(PDF_RENDER_WORKERS=1, PDF_RENDER_CONCURRENCY=2)
+    def test_pool_smaller_than_the_limit_is_a_warning(self):
+        self.assertEqual([w.id for w in checks.check_render_pool(None)], ['maintain.W001'])
+
+
+@plain_static
+@mock.patch('maintain.pdf_cache._cache', None)
+class AsyncViewTests(TestCase):
+    async def test_wizard_and_pdf_under_asgi(self):
+        await self.async_client.get('/dev-autofill/')
+        response = await self.async_client.get('/start/?step=financials')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Wizard-Step'], 'financials')
+        response = await self.async_client.get('/generate_pdf/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF-'))
+
+    async def test_downloads_stream_an_async_iterator_under_asgi(self):
+        await self.async_client.get('/dev-autofill/')
+        response = await self.async_client.get('/download-summary/')
+        self.assertTrue(response.is_async)
+        self.assertEqual([chunk async for chunk in response.streaming_content][0], b'Section,Question,Answer\r\n')
+
+    def test_downloads_stream_a_sync_iterator_under_wsgi(self):
+        self.client.get('/dev-autofill/')
+        self.assertFalse(self.client.get('/download-summary/').is_async)
+
+    async def test_claims_export_reads_the_database_off_the_event_loop(self):
+        user = await sync_to_async(User.objects.create_user)('staff', is_staff=True)
+        await self.async_client.aforce_login(user)
+        with mock.patch.object(streaming, 'athread_chunks', wraps=streaming.athread_chunks) as athread_chunks:
+            response = await self.async_client.get('/export/claims.csv')
+        athread_chunks.assert_called_once()
+        self.assertEqual(len([chunk async for chunk in response.streaming_content]), 1)
+
+
+@plain_static
+class ServerTimingTests(TestCase):
+    def test_header_lists_the_spans(self):
+        self.client.get('/dev-autofill/')
+        header = self.client.get('/start/?step=financials')['Server-Timing']
+        names = [part.split(';')[0] for part in header.split(', ')]
+        for name in ('session-load', 'claim-load', 'form', 'render', 'total'):
+            self.assertIn(name, names)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_header_can_be_turned_off(self):
+        self.assertNotIn('Server-Timing', self.client.get('/start/'))
+
+    def test_log_line(self):
+        with self.assertLogs('maintain.timing', 'INFO') as logs:
+            self.client.get('/start/')
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['method'], line['path'], line['status']), ('GET', '/start/', 200))
+        self.assertIn('write', line['spans_ms'])
+        self.assertGreaterEqual(line['total_ms'], line['spans_ms']['render'])
+
+
+class TimingSpanTests(SimpleTestCase):
+    def test_spans_add_up(self):
+        timings = timing.Timings()
+        token = timing._current.set(timings)
+        try:
+            for _ in range(2):
+                with timing.span('pdf-fill'):
+                    pass
+        finally:
+            timing._current.reset(token)
+        self.assertEqual(timings.spans['pdf-fill'][1], 2)
+        self.assertRegex(timings.header(), r'^pdf-fill;dur=[\d.]+, total;dur=[\d.]+$')
+
+
+@plain_static
+@override_settings(METRICS_TOKEN='s3cret', METRICS_PUBLIC=False)
+class MetricsTests(TestCase):
+    def test_access(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-store', response['Cache-Control'])
+
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_no_token_configured(self):
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code, 403)
+        with self.settings(METRICS_PUBLIC=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_requests_and_steps_are_counted(self):
+        def step_views():
+            return REGISTRY.get_sample_value('maintain_wizard_step_views_total', {'step': 'applicant_details'}) or 0
+
+        before = step_views()
+        self.client.get('/start/')
+        self.assertEqual(step_views(), before + 1)
+        body = self.client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).content.decode()
+        self.assertIn('maintain_request_duration_seconds_count{method="GET",status="200",view="wizard_start"}', body)
+
+
+@plain_static
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(
+            PROFILING=True, PROFILER='cprofile', PROFILE_SAMPLE_RATE=0, PROFILE_DIR=directory.name, PROFILE_KEEP=2,
+        ))
+
+        @profiling.profiled
+        def slow_view(request):
+            time.sleep(0.05)
+            return HttpResponse()
+
+        self.view = slow_view
+
+    def request(self, is_staff, **headers):
+        request = RequestFactory().get('/', headers=headers)
+        request.user = mock.Mock(is_staff=is_staff)
+        return request
+
+    def test_staff_can_ask_for_a_profile(self):
+        self.view(self.request(is_staff=False, X_Profile='1'))
+        self.view(self.request(is_staff=True))
+        self.assertEqual(profiling.saved_profiles(), [])
+
+        self.view(self.request(is_staff=True, X_Profile='1'))
+        [profile] = profiling.saved_profiles()
+        self.assertEqual((profile['view'], profile['format']), ('slow_view', 'prof'))
+        self.assertGreaterEqual(profile['ms'], 50)
+        stats = pstats.Stats(str(profiling.profile_path(profile['name'])))
+        self.assertIn('slow_view', {function for _, _, function in stats.stats})
+
+    @override_settings(PROFILER='sampling', PROFILE_SAMPLE_RATE=1)
+    def test_sampled_requests_are_profiled(self):
+        self.view(self.request(is_staff=False))
+        [profile] = profiling.saved_profiles()
+        self.assertEqual(profile['format'], 'collapsed')
+        content = profiling.profile_path(profile['name']).read_text()
+        self.assertRegex(content, r'slow_view \(tests\.py:\d+\) \d+\n')
+
+    @override_settings(PROFILE_SAMPLE_RATE=1)
+    def test_only_the_newest_profiles_are_kept(self):
+        for _ in range(3):
+            self.view(self.request(is_staff=False))
+        self.assertEqual(len(os.listdir(profiling.profile_dir())), 2)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1)
+    def test_staff_download_profiles(self):
+        self.view(self.request(is_staff=False))
+        [profile] = profiling.saved_profiles()
+        self.assertEqual(self.client.get('/profiles/').status_code, 302)
+
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertContains(self.client.get('/profiles/'), profile['name'])
+        response = self.client.get(f"/profiles/{profile['name']}")
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="{profile["name"]}"')
+        self.assertEqual(self.client.get('/profiles/..%2Fdb.sqlite3').status_code, 404)
+
+    def test_profiling_off_leaves_views_alone(self):
+        view = mock.Mock()
+        with self.settings(PROFILING=False):
+            self.assertIs(profiling.profiled(view), view)
@@ -0,0 +1,118 @@
+# maintain/timing.py
+
+"""
+Per-request timing of the stages we care about.
+
+server_timing_middleware gives each request a Timings, and code wraps its
+stages in span('name'); spans outside a request (e.g. background PDF
+jobs) cost nothing and are dropped. When the response is ready the
+spans so far are sent as a Server-Timing header, which browsers show in
+their network panel. When the response has been written out, a JSON
+line with every span, including 'write' for sending the body, is logged
+to the 'maintain.timing' logger.
+
+The current Timings lives in a context variable, so spans are recorded
+from sync and async code alike, and from threads that run with a copy
+of the request's context (sync_to_async does this; see
+pdf_cache.arender_j101 for the render pool).
+"""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('timings', default=None)
+
+
+class Timings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        # {span name: [total seconds, count]}, in the order first seen.
+        self.spans = {}
+
+    def add(self, name, seconds):
+        span = self.spans.setdefault(name, [0.0, 0])
+        span[0] += seconds
+        span[1] += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def header(self):
+        parts = [f'{name};dur={seconds * 1000:.1f}' for name, (seconds, _) in self.spans.items()]
+        parts.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(parts)
+
+
+@contextmanager
+def span(name):
+    """
+    Adds the time spent in the block to the current request's span `name`.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def log_request(request, response, timings, handled):
+    """
+    Logs the request's spans once its response has been written out;
+    `handled` is the time the response was ready.
+    """
+    spans = {name: round(seconds * 1000, 2) for name, (seconds, _) in timings.spans.items()}
+    spans['write'] = round((time.perf_counter() - handled) * 1000, 2)
+    logger.info(json.dumps({
+        'method': request.method,
+        'path': request.path,
+        'view': getattr(request.resolver_match, 'view_name', None),
+        'status': response.status_code,
+        'total_ms': round(timings.elapsed() * 1000, 2),
+        'spans_ms': spans,
+    }, separators=(',', ':')))
+
+
+def finish(request, response, timings):
+    if settings.SERVER_TIMING:
+        response['Server-Timing'] = timings.header()
+    if logger.isEnabledFor(logging.INFO):
+        handled = time.perf_counter()
+        # Runs from response.close(), which the server calls after sending the body.
+        response._resource_closers.append(lambda: log_request(request, response, timings, handled))
+    return response
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            timings = Timings()
+            token = _current.set(timings)
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return finish(request, response, timings)
+    else:
+        def middleware(request):
+            timings = Timings()
+            token = _current.set(timings)
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            return finish(request, response, timings)
+    return middleware
@@ -7,10 +7,20 @@ urlpatterns = [
     
     # 2. The wizard starts at its own dedicated URL
     path('start/', views.claim_wizard, name='wizard_start'),
+    path('start/autosave/', views.wizard_autosave, name='wizard_autosave'),
 
     path('summary/', views.summary_page, name='summary_page'),
+    path('resume/<str:token>/', views.resume_claim, name='resume_claim'),
     path('generate_pdf/', views.generate_pdf, name='generate_pdf'),
+    path('generate_pdf/jobs/', views.pdf_job_submit, name='pdf_job_submit'),
+    path('generate_pdf/jobs/<uuid:job_id>/', views.pdf_job_status, name='pdf_job_status'),
+    path('generate_pdf/jobs/<uuid:job_id>/download/', views.pdf_job_download, name='pdf_job_download'),
     path('dev-autofill/', views.dev_autofill_and_redirect, name='dev_autofill'),
      path('downloads/', views.downloads_page, name='downloads_page'),
      path('download-summary/', views.download_summary_csv, name='download_summary'), 
+     path('download-bundle/', views.download_bundle, name='download_bundle'),
+     path('export/claims.csv', views.export_claims_csv, name='export_claims_csv'),
+     path('metrics', views.metrics_view, name='metrics'),
+     path('profiles/', views.profiles_page, name='profiles_page'),
+     path('profiles/<str:name>', views.profile_download, name='profile_download'),
 ]
\ No newline at end of file
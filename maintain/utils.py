@@ -28,14 +28,14 @@ def extract_dob_from_id(id_number):
         # Handles cases where the date is invalid (e.g., month 13)
         return None
 
-def calculate_age(birthdate):
+def calculate_age(birthdate, today=None):
     """
-    Calculates age from a date object.
+    Calculates age from a date object, as at `today` (default: the current date).
     Returns age as an integer, or an empty string if birthdate is invalid.
     """
     if not isinstance(birthdate, date):
         return ""
-    today = date.today()
+    today = today or date.today()
     age = today.year - birthdate.year - ((today.month, today.day) < (birthdate.month, birthdate.day))
     return str(age)
 
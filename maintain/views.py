@@ -9,16 +9,23 @@ from .forms import (
     ApplicantIncomeAssetsForm,
     FinancialsForm
 )
-import csv
-import io
-from datetime import date, datetime
-from decimal import Decimal
-from .pdf_map import PDF_FIELD_MAP, PDF_CHAR_MAP, PDF_CHILD_MAP
-
-from . import utils # Make sure this import is at the top
-from django.http import HttpResponse
-from django.shortcuts import redirect
-from fillpdf import fillpdfs
+import json
+from datetime import date
+from .claim_data import ClaimData
+from .pdf_payload import build_pdf_data
+
+from . import (
+    admission, autosave, claims, csv_export, metrics, pdf_cache, pdf_jobs, profiling, schema, streaming, timing,
+    zip_stream,
+)
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib import admin
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_POST
 
 
 # This dictionary maps step names to their corresponding form classes
@@ -33,47 +40,64 @@ WIZARD_FORMS = {
 # This defines the order of the steps
 WIZARD_STEPS = list(WIZARD_FORMS.keys())
 
+# Requests with this header get just the step's HTML (see wizard/_fragment_nav.html).
+FRAGMENT_HEADER = 'X-Wizard-Fragment'
+FRAGMENT_BASE_TEMPLATE = 'wizard/_fragment.html'
+
+# The columns of the one-row-per-claim CSV export
+CLAIM_CSV_COLUMNS = csv_export.wide_columns(WIZARD_FORMS)
+
+# Simple checklist for now, we can make this dynamic later
+SUPPORTING_DOCS = [
+    "Your South African ID (Original and a certified copy)",
+    "Birth certificate for each child (Certified copies)",
+    "Your last 3 months of bank statements",
+    "Proof of your income (e.g., latest payslip)",
+    "Proof of your current residential address",
+    "A detailed list of your monthly expenses",
+    "(If applicable) Your marriage certificate or divorce order",
+    "(If applicable) Any previous maintenance orders",
+]
+
 
-def make_serializable(data):
+def build_step_form(step_name, wizard_data):
     """
-    Converts date and decimal objects in form data to strings
-    to make them JSON serializable for session storage.
+    Returns the unbound form (or formset) for a step, filled with its saved answers.
     """
-    if isinstance(data, list): # This handles formsets
-        for item in data:
-            for key, value in item.items():
-                if isinstance(value, date):
-                    item[key] = value.isoformat()
-                elif isinstance(value, Decimal):
-                    item[key] = str(value)
-        return data
-    
-    # This handles regular forms
-    for key, value in data.items():
-        if isinstance(value, date):
-            data[key] = value.isoformat()
-        elif isinstance(value, Decimal):
-            data[key] = str(value)
-    return data
-
-def claim_wizard(request):
-    wizard_data = request.session.get('wizard_data', {})
-    session_step = request.session.get('current_step', WIZARD_STEPS[0])
+    FormClass = WIZARD_FORMS[step_name]
+    initial_data = wizard_data.initial(step_name)
+    if hasattr(FormClass, 'management_form'):
+        return FormClass(initial=initial_data, prefix=step_name)
+    return FormClass(initial=initial_data)
+
+
+@profiling.profiled
+async def claim_wizard(request):
+    wizard_data = await claims.aload_claim_data(request)
+    # Fragment requests come from the wizard's own script, which swaps the
+    # step into the page instead of loading a whole new document.
+    fragment = request.headers.get(FRAGMENT_HEADER) == '1'
+    session_step = await request.session.aget('current_step', WIZARD_STEPS[0])
+    # Autosaved steps have answers but may not pass their forms; only
+    # steps that do count as done.
+    await claims.avalidate_steps(request, wizard_data)
+    completed_steps = claims.validated_steps(wizard_data)
 
     # --- NAVIGATION LOGIC ---
     get_step = request.GET.get('step')
     if request.method == 'GET' and get_step in WIZARD_STEPS:
-        completed_indices = [WIZARD_STEPS.index(s) for s in wizard_data.keys() if s in WIZARD_STEPS]
-        max_completed_index = max(completed_indices) if completed_indices else -1
-        
-        if WIZARD_STEPS.index(get_step) <= max_completed_index + 1:
+        # The first step that isn't done is as far as the user can go.
+        first_open_index = next(
+            (i for i, step in enumerate(WIZARD_STEPS) if step not in completed_steps), len(WIZARD_STEPS),
+        )
+        if WIZARD_STEPS.index(get_step) <= first_open_index:
             current_step_name = get_step
         else:
-            current_step_name = WIZARD_STEPS[max_completed_index + 1] if max_completed_index + 1 < len(WIZARD_STEPS) else session_step
+            current_step_name = WIZARD_STEPS[first_open_index]
     else:
         current_step_name = session_step
     
-    request.session['current_step'] = current_step_name
+    await request.session.aset('current_step', current_step_name)
     
     # --- FORM PROCESSING ---
     if request.method == 'POST':
@@ -83,15 +107,18 @@ def claim_wizard(request):
         
         is_formset = 'formset' in str(FormClass).lower()
         
-        if is_formset:
-            form = FormClass(request.POST, prefix=submitted_step_name)
-        elif submitted_step_name == 'respondent_details':
-            applicant_id = wizard_data.get('applicant_details', {}).get('id_number')
-            form = FormClass(request.POST, applicant_id=applicant_id)
-        else:
-            form = FormClass(request.POST)
+        with timing.span('form'):
+            if is_formset:
+                form = FormClass(request.POST, prefix=submitted_step_name)
+            elif submitted_step_name == 'respondent_details':
+                applicant_id = wizard_data.applicant_details.id_number if wizard_data.applicant_details else None
+                form = FormClass(request.POST, applicant_id=applicant_id)
+            else:
+                form = FormClass(request.POST)
 
-        if form.is_valid():
+        with timing.span('validate'):
+            is_valid = form.is_valid()
+        if is_valid:
             cleaned_data = form.cleaned_data
             if submitted_step_name == 'child_details':
                 # Filter out any empty forms or forms marked for deletion
@@ -107,31 +134,36 @@ def claim_wizard(request):
                 if 'other_contributions_text' in cleaned_data:
                     cleaned_data['other_contributions_text'] = cleaned_data['other_contributions_text'].replace('sdadgasd', '').strip()
 
-            wizard_data[submitted_step_name] = make_serializable(cleaned_data)
-            request.session['wizard_data'] = wizard_data
+            # Only this step's column is written, and only if its answers changed.
+            await claims.asave_step(request, submitted_step_name, cleaned_data, wizard_data)
+            metrics.WIZARD_STEP_COMPLETIONS.labels(submitted_step_name).inc()
 
             current_index = WIZARD_STEPS.index(submitted_step_name)
             if current_index + 1 < len(WIZARD_STEPS):
                 next_step_name = WIZARD_STEPS[current_index + 1]
-                request.session['current_step'] = next_step_name
-                return redirect(f"{reverse('wizard_start')}?step={next_step_name}")
+                await request.session.aset('current_step', next_step_name)
+                if not fragment:
+                    return redirect(f"{reverse('wizard_start')}?step={next_step_name}")
+                # Answer with the next step straight away instead of a redirect to it.
+                current_step_name = next_step_name
+                with timing.span('form'):
+                    form = build_step_form(current_step_name, wizard_data)
+                metrics.WIZARD_STEP_VIEWS.labels(current_step_name).inc()
             else:
-                if 'current_step' in request.session:
-                    del request.session['current_step']
+                await request.session.apop('current_step', None)
+                if fragment:
+                    # A redirect would be followed by fetch(); tell the script to leave the wizard.
+                    return HttpResponse(status=204, headers={'X-Wizard-Redirect': reverse('summary_page')})
                 return redirect('summary_page')
         else:
             current_step_name = submitted_step_name
             pass
     
     else: # GET request
-        FormClass = WIZARD_FORMS.get(current_step_name)
-        is_formset = 'formset' in str(FormClass).lower()
-        initial_data = wizard_data.get(current_step_name, {})
-
-        if is_formset:
-            form = FormClass(initial=initial_data, prefix=current_step_name)
-        else:
-            form = FormClass(initial=initial_data)
+        with timing.span('form'):
+            form = build_step_form(current_step_name, wizard_data)
+        # Re-shown invalid forms aren't counted, so views are people reaching the step.
+        metrics.WIZARD_STEP_VIEWS.labels(current_step_name).inc()
 
     # --- PREPARE CONTEXT FOR TEMPLATE ---
     template_name = f'wizard/{current_step_name}.html'
@@ -150,333 +182,314 @@ def claim_wizard(request):
     context = {
         'form': form,
         'wizard_data': wizard_data,
-        'completed_steps': list(wizard_data.keys()),
+        'completed_steps': claims.validated_steps(wizard_data),
         'current_step_name': current_step_name,
         'nav_steps': nav_steps, # Use this new list for navigation
-        'current_step_index': WIZARD_STEPS.index(current_step_name)
+        'current_step_index': WIZARD_STEPS.index(current_step_name),
+        'base_template': FRAGMENT_BASE_TEMPLATE if fragment else 'base.html',
     }
     
     if hasattr(form, 'management_form'):
         context['management_form'] = form.management_form
 
-    return render(request, template_name, context)
+    with timing.span('render'):
+        response = render(request, template_name, context)
+    response['X-Wizard-Step'] = current_step_name
+    patch_vary_headers(response, [FRAGMENT_HEADER])
+    return response
+
+
+@require_POST
+def wizard_autosave(request):
+    """
+    Saves a patch of one or a few wizard fields, sent as JSON:
+    {"step": "financials", "fields": {"self_lodging": "4000"}}.
+    Only the patched fields are validated and merged into the claim.
+    """
+    try:
+        patch = json.loads(request.body)
+        step_name, fields = patch['step'], patch['fields']
+        if not isinstance(step_name, str) or not isinstance(fields, dict):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected {"step": ..., "fields": {...}}.'}, status=400)
+    if step_name not in WIZARD_FORMS:
+        return JsonResponse({'error': 'Unknown wizard step.'}, status=400)
+
+    wizard_data = claims.load_claim_data(request)
+    list_length = len(getattr(wizard_data, step_name) or []) if step_name in ClaimData.LIST_STEPS else 0
+    changes, saved, errors = autosave.clean_patch(step_name, WIZARD_FORMS[step_name], fields, list_length)
+    if changes:
+        claims.patch_step(request, step_name, changes, wizard_data)
+    return JsonResponse({'saved': saved, 'errors': errors})
 
 
 def summary_page(request):
-    wizard_data = request.session.get('wizard_data', {})
+    wizard_data = claims.load_claim_data(request)
     # In a real app, you would clear the session data here after use
     # For now, we'll keep it for easy testing
     # request.session.flush() 
-    return render(request, 'summary.html', {'wizard_data': wizard_data})
+    context = {
+        'wizard_data': wizard_data,
+        # Only steps changed since they last passed validation are re-checked.
+        'invalid_steps': claims.validate_steps(request, wizard_data),
+        'derived': claims.derived_values(request, wizard_data),
+        'expense_fields': schema.EXPENSE_FIELD_SET,
+        'expense_lines': schema.expense_lines(wizard_data.financials) if wizard_data.financials else [],
+        'resume_url': request.build_absolute_uri(reverse('resume_claim', args=[claims.get_token(request)])) if wizard_data else None,
+    }
+    return render(request, 'summary.html', context)
+
+
+def resume_claim(request, token):
+    """
+    Continues a saved draft, e.g. on another device, from its resume link.
+    """
+    if not claims.resume(request, token):
+        raise Http404("No such application.")
+    return redirect('wizard_start')
 
 def index(request):
     return render(request, 'landing_page.html')
 
 
 # In claims/views.py
-def download_summary_csv(request):
+async def download_summary_csv(request):
     """
-    Retrieves wizard data from the session and generates a CSV file for download.
+    Streams the session's wizard data as a CSV file: one row per answer,
+    or with ?layout=wide, a single row with one column per form field.
     """
-    wizard_data = request.session.get('wizard_data', {})
+    wizard_data = await claims.aload_claim_data(request)
 
     # If there's no data, redirect the user to the start of the wizard
     if not wizard_data:
         return redirect('wizard_start')
 
-    # Create an in-memory text buffer that the csv module can write to
-    buffer = io.StringIO()
-    writer = csv.writer(buffer)
-
-    # Write the header row for the CSV file
-    writer.writerow(['Section', 'Question', 'Answer'])
-
-    # A helper function to make section titles more readable
-    def format_title(title):
-        return title.replace('_', ' ').title()
+    if request.GET.get('layout') == 'wide':
+        rows = csv_export.wide_csv_rows([wizard_data], CLAIM_CSV_COLUMNS)
+    else:
+        rows = csv_export.summary_csv_rows(wizard_data)
 
-    # Iterate through all the steps and data stored in the session
-    for step_name, step_data in wizard_data.items():
-        
-        # Handle formsets like 'child_details' which are lists of dictionaries
-        if isinstance(step_data, list):
-            for i, item_data in enumerate(step_data):
-                # e.g., "Child Details 1", "Child Details 2"
-                item_title = f"{format_title(step_name)} {i + 1}"
-                if isinstance(item_data, dict):
-                    for question, answer in item_data.items():
-                        writer.writerow([item_title, question, str(answer)])
-
-        # Handle regular form data which is a single dictionary
-        elif isinstance(step_data, dict):
-            section_title = format_title(step_name)
-            for question, answer in step_data.items():
-                # Skip the hidden form_step field
-                if question == 'form_step':
-                    continue
-                writer.writerow([section_title, question, str(answer)])
-
-    # Get the complete CSV string from the buffer
-    csv_string = buffer.getvalue()
-
-    # Create the HttpResponse object with the correct CSV headers.
-    # 'text/csv' tells the browser it's a CSV file.
     # 'Content-Disposition' tells the browser to treat it as an attachment and suggests a filename.
-    response = HttpResponse(csv_string, content_type='text/csv')
+    response = StreamingHttpResponse(streaming.response_chunks(request, csv_export.iter_csv(rows)), content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="maintenance_application_summary.csv"'
     
     return response
 
-def generate_pdf(request):
-    wizard_data = request.session.get('wizard_data', {})
-    if not wizard_data:
-        return redirect('wizard_start')
 
-    # --- 1. GATHER ALL DATA FROM SESSION ---
-    applicant = wizard_data.get('applicant_details', {})
-    respondent = wizard_data.get('respondent_details', {})
-    children = wizard_data.get('child_details', [])
-    income_assets = wizard_data.get('applicant_income_assets', {})
-    financials = wizard_data.get('financials', {})
-
-    final_pdf_data = {}
-
-   
-    def get_decimal(data, key):
-        return Decimal(str(data.get(key) or '0.00'))
-
-    # --- 2. PREPARE AND CALCULATE INCOME & ASSETS ---
-    gross = get_decimal(income_assets, 'gross_salary')
-    other_income = get_decimal(income_assets, 'other_income_1')
-    total_deductions = sum([
-        get_decimal(income_assets, 'tax'),
-        get_decimal(income_assets, 'medical_aid'),
-        get_decimal(income_assets, 'pension'),
-        get_decimal(income_assets, 'other_deductions')
-    ])
-    nett_salary = gross - total_deductions
-    total_income = nett_salary + other_income
-    
-    total_maintenance_claimed = Decimal('0.00')
+@staff_member_required
+def export_claims_csv(request):
+    """
+    Streams every stored claim as one wide CSV row, for reporting.
+    Claims are read from the database in chunks, so memory use does
+    not grow with the number of claims.
+    """
+    rows = csv_export.wide_csv_rows(csv_export.stored_claims(), CLAIM_CSV_COLUMNS)
+    response = StreamingHttpResponse(
+        streaming.response_chunks(request, csv_export.iter_csv(rows), blocking=True), content_type='text/csv',
+    )
+    response['Content-Disposition'] = f'attachment; filename="maintenance_claims_{date.today().isoformat()}.csv"'
+    return response
 
-    applicant_id_number = applicant.get('id_number')
-    applicant_dob_obj = utils.extract_dob_from_id(applicant_id_number)
-    
-    if not applicant_dob_obj:
-        try:
-            applicant_dob_obj = date.fromisoformat(applicant.get('date_of_birth', ''))
-        except (ValueError, TypeError):
-            applicant_dob_obj = None # Ensure it's None if invalid
-    
-    applicant_dob_iso = applicant_dob_obj.isoformat() if applicant_dob_obj else '----------'
-    applicant_age = utils.calculate_age(applicant_dob_obj)
-
-    # We will do the same for the respondent for consistency
-    respondent_id_number = respondent.get('id_number')
-    respondent_dob_obj = utils.extract_dob_from_id(respondent_id_number)
-    if not respondent_dob_obj:
-        try:
-            respondent_dob_obj = date.fromisoformat(respondent.get('date_of_birth', ''))
-        except (ValueError, TypeError):
-            respondent_dob_obj = None
-
-    respondent_dob_iso = respondent_dob_obj.isoformat() if respondent_dob_obj else '----------'
-    respondent_age = utils.calculate_age(respondent_dob_obj)
-
-    applicant_full_address = applicant.get('residential_address', '')
-    if applicant.get('postal_code'):
-        applicant_full_address += f", {applicant.get('postal_code')}"
-    
-    respondent_full_address = respondent.get('home_address', '')
-    if respondent.get('postal_code'):
-        respondent_full_address += f", {respondent.get('postal_code')}"
-
-    # MODIFIED: Split phone numbers into code and number
-    applicant_phone_str = str(applicant.get('contact_phone', '')).replace(' ', '')
-    applicant_phone_code = applicant_phone_str[:3]
-    applicant_phone_number = applicant_phone_str[3:]
-
-    respondent_phone_str = str(respondent.get('contact_phone', '')).replace(' ', '')
-    respondent_phone_code = respondent_phone_str[:3]
-    respondent_phone_number = respondent_phone_str[3:]
-    logical_data = {
-        'applicant_ref_no': "",
-        'applicant_name': applicant.get('full_name', ''),
-        'applicant_age': applicant_age,
-        'applicant_address_1': utils.wrap_text(applicant_full_address, 85)[0], 
-        'applicant_phone_code': applicant_phone_code,           
-        'applicant_phone_number': applicant_phone_number,       
-        'applicant_work_address_1': applicant.get('work_address', ''),
-        'applicant_work_phone': applicant.get('work_phone', ''),
-        'applicant_police_station': applicant.get('nearest_police_station', ''),
-        'respondent_name': respondent.get('full_name', ''),
-        'respondent_age': respondent_age,
-        'respondent_address_1': utils.wrap_text(respondent_full_address, 85)[0], 
-        'respondent_phone_code': respondent_phone_code,          
-        'respondent_phone_number': respondent_phone_number,       
-        'respondent_work_address_1': respondent.get('work_address', ''),
-        'respondent_work_phone': respondent.get('work_phone', ''),
-        'reason_liable_1': utils.wrap_text(financials.get('legally_liable_reason', ''), 75)[0],
-        'reason_liable_2': utils.wrap_text(financials.get('legally_liable_reason', ''), 75)[1],
-        'reason_care_1': utils.wrap_text(financials.get('child_in_care_reason', ''), 65)[0],
-        'reason_care_2': utils.wrap_text(financials.get('child_in_care_reason', ''), 5)[1],
-        'date_not_supported': financials.get('date_not_supported', ''),
-        'first_payment_date': financials.get('first_payment_date', ''),
-        'payment_in_favour_of': financials.get('payment_in_favour_of', ''),
-        'payment_day': financials.get('payment_day', ''),
-        'payment_made_to': financials.get('payment_made_to', ''),
-        'other_contributions_1': utils.wrap_text(financials.get('other_contributions_text', ''), 80)[0],
-        'other_contributions_2': utils.wrap_text(financials.get('other_contributions_text', ''), 80)[1],
-        'asset_fixed_property': f"{get_decimal(income_assets, 'fixed_property'):.2f}",
-        'asset_investments': f"{get_decimal(income_assets, 'investments'):.2f}",
-        'asset_savings': f"{get_decimal(income_assets, 'savings'):.2f}",
-        'asset_shares': f"{get_decimal(income_assets, 'shares'):.2f}",
-        'asset_motor_vehicles': f"{get_decimal(income_assets, 'motor_vehicles'):.2f}",
-        # Income & Deductions (with calculations)
-        'income_gross_salary': f"{gross:.2f}",
-        'income_other_1': f"{other_income:.2f}",
-        'deduction_tax': f"{get_decimal(income_assets, 'tax'):.2f}",
-        'deduction_medical_aid': f"{get_decimal(income_assets, 'medical_aid'):.2f}",
-        'deduction_pension': f"{get_decimal(income_assets, 'pension'):.2f}",
-        'deduction_other': f"{get_decimal(income_assets, 'other_deductions'):.2f}",
-        'income_nett_salary': f"{nett_salary:.2f}",
-        'income_total': f"{total_income:.2f}",
-    }
+def pdf_filename(wizard_data):
+    applicant = wizard_data.applicant_details
+    return f'maintenance_application_{applicant.full_name if applicant else "user"}.pdf'
 
-    for logical_name, pdf_key in PDF_FIELD_MAP.items():
-        value = logical_data.get(logical_name)
-        if value and str(value) not in ['0.00', '0']:
-            final_pdf_data[pdf_key] = value
 
-    # --- 3. POPULATE CHARACTER-BY-CHARACTER FIELDS ---
-    def map_chars(pdf_keys, string_data, length):
-        string_data = str(string_data).ljust(length)
-        for i, key in enumerate(pdf_keys):
-            final_pdf_data[key] = string_data[i]
+def overloaded_response(error):
+    response = HttpResponse(
+        "We are generating a lot of applications right now. Please try again in a few seconds.",
+        status=503, content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(error.retry_after)
+    patch_cache_control(response, no_store=True)
+    return response
 
-    applicant_dob_str = applicant_dob_obj.strftime('%d%m%y') if applicant_dob_obj else '------'
-    map_chars(PDF_CHAR_MAP['applicant_dob'], applicant_dob_str, 6)
-    map_chars(PDF_CHAR_MAP['applicant_id'], applicant.get('id_number', ''), 13)
-    
-    respondent_dob_str = respondent_dob_obj.strftime('%d%m%y') if respondent_dob_obj else '------'
-    map_chars(PDF_CHAR_MAP['respondent_dob'], respondent_dob_str, 6)
-    map_chars(PDF_CHAR_MAP['respondent_id'], respondent.get('id_number', ''), 13)
-
-    # --- 4. POPULATE THE CHILDREN TABLE ---
-    total_maintenance_claimed = get_decimal(financials, 'total_maintenance_claimed')
-    num_children = len(children)
-    amount_per_child = total_maintenance_claimed / num_children if num_children > 0 else Decimal('0.00')
-    
-    for i, child_data in enumerate(children):
-        if i < len(PDF_CHILD_MAP):
-            map_keys = PDF_CHILD_MAP[i]
-            
-            # Use the calculated per-child amount
-            final_pdf_data[map_keys['amount']] = f"{amount_per_child:.2f}"
-            final_pdf_data[map_keys['name']] = child_data.get('full_name', '')
-            
-            child_dob_str = child_data.get('date_of_birth')
-            formatted_dob = date.fromisoformat(child_dob_str).strftime('%d%m%Y') if child_dob_str else '--------'
-            map_chars(map_keys['dob'], formatted_dob, 8)
-
-    # Populate the total claim amount field on the PDF
-    final_pdf_data[PDF_FIELD_MAP['claim_total']] = f"{total_maintenance_claimed:.2f}"
-
-
-    # --- 5. POPULATE AND SUM THE EXPENDITURE TABLE ---
-    expense_rows = [
-        # Logical Name,         Self Field Key in Form,     Child Field Key in Form
-        ('lodging',             'self_lodging',             'child_lodging'),
-        ('groceries',           'self_groceries',           'child_groceries'),
-        ('utilities',           'self_utilities',           'child_utilities'),
-        ('rates_taxes',         'self_rates_taxes',         'child_rates_taxes'),
-        ('laundry',             'self_laundry',             'child_laundry'),
-        ('telephone',           'self_telephone',           'child_telephone'),
-        ('clothing',            'self_clothing',            'child_clothing'),
-        ('school_uniforms',     None,                       'child_school_uniforms'),
-        ('transport_public',    'self_transport_public',    'child_transport_public'),
-        ('car_insurance',       'self_car_insurance',       'child_car_insurance'),
-        ('car_maintenance',     'self_car_maintenance',     'child_car_maintenance'),
-        ('fuel',                'self_fuel',                'child_fuel'),
-        ('school_fees',         None,                       'child_school_fees'),
-        ('stationery',          None,                       'child_stationery'),
-        ('extramural',          None,                       'child_extramural'),
-        ('medical',             'self_medical',             'child_medical'),
-        ('medication',          'self_medication',          'child_medication'),
-        ('entertainment',       'self_entertainment',       'child_entertainment'),
-        ('other',               'self_other',               'child_other'),
-    ]
-    total_self_expenditure = Decimal('0.00')
-    total_child_expenditure = Decimal('0.00')
-
-    for logical_name, self_key, child_key in expense_rows:
-        self_amount = get_decimal(financials, self_key) if self_key else 0
-        child_amount = get_decimal(financials, child_key) if child_key else 0
-        row_total = self_amount + child_amount
-
-        # Add amounts to the grand totals
-        total_self_expenditure += self_amount
-        total_child_expenditure += child_amount
-
-        # Populate PDF fields for this row if values are not zero
-        if self_amount > 0:
-            pdf_field_key = f'expense_self_{logical_name}'
-            if pdf_field_key in PDF_FIELD_MAP:
-                final_pdf_data[PDF_FIELD_MAP[pdf_field_key]] = f"{self_amount:.2f}"
-        
-        if child_amount > 0:
-            pdf_field_key = f'expense_child_{logical_name}'
-            if pdf_field_key in PDF_FIELD_MAP:
-                final_pdf_data[PDF_FIELD_MAP[pdf_field_key]] = f"{child_amount:.2f}"
-        
-        if row_total > 0:
-            pdf_field_key = f'expense_total_{logical_name}'
-            if pdf_field_key in PDF_FIELD_MAP:
-                final_pdf_data[PDF_FIELD_MAP[pdf_field_key]] = f"{row_total:.2f}"
-
-    final_total_expenditure = total_self_expenditure + total_child_expenditure
-
-    # Populate the total fields in the PDF
-    if total_self_expenditure > 0:
-        final_pdf_data[PDF_FIELD_MAP['expenditure_total_self_col']] = f"{total_self_expenditure:.2f}"
-    if total_child_expenditure > 0:
-        final_pdf_data[PDF_FIELD_MAP['expenditure_total_child_col']] = f"{total_child_expenditure:.2f}"
-    if final_total_expenditure > 0:
-        final_pdf_data[PDF_FIELD_MAP['expenditure_total_final']] = f"{final_total_expenditure:.2f}"
-    
 
+@profiling.profiled
+async def generate_pdf(request):
+    wizard_data = await claims.aload_claim_data(request)
+    if not wizard_data:
+        return redirect('wizard_start')
+    if await claims.avalidate_steps(request, wizard_data):
+        # The summary lists what needs fixing.
+        return redirect('summary_page')
+
+    with timing.span('payload'):
+        final_pdf_data = build_pdf_data(wizard_data, derived_values=await claims.aderived_values(request, wizard_data))
+
+    # The cache key is a hash of the payload, so it also serves as the ETag:
+    # a browser re-downloading unchanged answers gets a 304 without any rendering.
+    cache_key = pdf_cache.cache_key(final_pdf_data)
+    etag = quote_etag(cache_key)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        return not_modified
 
     # --- 6. GENERATE THE PDF ---
-    input_pdf_path = "J101_E_fillable.pdf"
-    output_pdf_path = "filled_form.pdf"
-    fillpdfs.write_fillable_pdf(input_pdf_path, output_pdf_path, final_pdf_data, flatten=True)
-
-    with open(output_pdf_path, 'rb') as f:
-        pdf_file = f.read()
-    
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="maintenance_application_{applicant.get("full_name", "user")}.pdf"'
+    # Rendered in memory so concurrent requests never share an output file,
+    # and on the render pool so the event loop is free while it runs.
+    try:
+        pdf_file = await pdf_cache.arender_j101(final_pdf_data, cache_key, limiter=admission.get_limiter())
+    except admission.Overloaded as e:
+        return overloaded_response(e)
+
+    with timing.span('response'):
+        response = HttpResponse(pdf_file, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{pdf_filename(wizard_data)}"'
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
     
     #request.session.flush() # Temporarily disabled for easier testing
     return response
 
+@staff_member_required
+def profiles_page(request):
+    """
+    Lists the saved request profiles (see profiling.py) for download.
+    """
+    context = dict(
+        admin.site.each_context(request),
+        title="Request profiles",
+        profiles=profiling.saved_profiles(),
+        profiling_enabled=settings.PROFILING,
+        profiler=settings.PROFILER,
+        sample_rate=settings.PROFILE_SAMPLE_RATE,
+        header=profiling.PROFILE_HEADER,
+    )
+    return render(request, 'admin/profiles.html', context)
+
+
+@staff_member_required
+def profile_download(request, name):
+    path = profiling.profile_path(name)
+    if path is None:
+        raise Http404("No such profile.")
+    return FileResponse(path.open('rb'), as_attachment=True, filename=name, content_type='application/octet-stream')
+
+
+def metrics_view(request):
+    """
+    Prometheus metrics (see metrics.py), for a scraper that sends
+    `Authorization: Bearer <METRICS_TOKEN>`, for staff, or for anyone
+    if METRICS_PUBLIC is on.
+    """
+    has_token = bool(settings.METRICS_TOKEN) and constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}',
+    )
+    if not (has_token or settings.METRICS_PUBLIC or request.user.is_staff):
+        return HttpResponse(status=403)
+    body, content_type = metrics.exposition()
+    response = HttpResponse(body, content_type=content_type)
+    patch_cache_control(response, no_store=True)
+    return response
+
+@require_POST
+def pdf_job_submit(request):
+    """
+    Queues a background render of the session's J101 and returns its job id.
+    """
+    wizard_data = claims.load_claim_data(request)
+    if not wizard_data:
+        return JsonResponse({'error': 'There is no application to generate.'}, status=400)
+    if claims.validate_steps(request, wizard_data):
+        # The download link's fallback, generate_pdf, sends them to the summary.
+        return JsonResponse({'error': 'Some answers need fixing first.'}, status=400)
+
+    try:
+        job_id = pdf_jobs.submit(
+            build_pdf_data(wizard_data, derived_values=claims.derived_values(request, wizard_data)),
+            limiter=admission.get_limiter(),
+        )
+    except admission.Overloaded as e:
+        return overloaded_response(e)
+    request.session['pdf_job'] = job_id
+    return JsonResponse({
+        'job_id': job_id,
+        'status_url': reverse('pdf_job_status', args=[job_id]),
+    }, status=202)
+
+
+def get_session_job(request, job_id):
+    # Only the session that started a job may poll or download it.
+    job_id = str(job_id)
+    if request.session.get('pdf_job') != job_id:
+        raise Http404("No such PDF job.")
+    return job_id
+
+
+def pdf_job_status(request, job_id):
+    job_id = get_session_job(request, job_id)
+    status = pdf_jobs.status(job_id)
+    if status is None:
+        raise Http404("No such PDF job.")
+
+    data = {'status': status}
+    if status == pdf_jobs.DONE:
+        data['download_url'] = reverse('pdf_job_download', args=[job_id])
+    return JsonResponse(data)
+
+
+def pdf_job_download(request, job_id):
+    job_id = get_session_job(request, job_id)
+    pdf_file = pdf_jobs.pop_result(job_id)
+    if pdf_file is None:
+        raise Http404("This PDF is not ready.")
+    del request.session['pdf_job']
+
+    response = HttpResponse(pdf_file, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{pdf_filename(claims.load_claim_data(request))}"'
+    return response
+
+def checklist_text():
+    lines = ["Documents to gather for your maintenance application", ""]
+    lines += [f"[ ] {doc}" for doc in SUPPORTING_DOCS]
+    return "\r\n".join(lines) + "\r\n"
+
+
+def download_bundle(request):
+    """
+    Streams a ZIP of everything the applicant needs: the J101 PDF, the
+    CSV summary and the document checklist, in a single request.
+    """
+    wizard_data = claims.load_claim_data(request)
+    if not wizard_data:
+        return redirect('wizard_start')
+    if claims.validate_steps(request, wizard_data):
+        return redirect('summary_page')
+
+    # Rendered up front, so a failure is a proper error response rather
+    # than a truncated archive.
+    try:
+        pdf_file = pdf_cache.render_j101(
+            build_pdf_data(wizard_data, derived_values=claims.derived_values(request, wizard_data)),
+            limiter=admission.get_limiter(),
+        )
+    except admission.Overloaded as e:
+        return overloaded_response(e)
+    name = pdf_filename(wizard_data)[:-len('.pdf')]
+
+    entries = [
+        (f'{name}.pdf', zip_stream.iter_chunks(pdf_file), False),
+        ('maintenance_application_summary.csv', csv_export.iter_csv(csv_export.summary_csv_rows(wizard_data)), True),
+        ('documents_checklist.txt', [checklist_text().encode('utf-8')], True),
+    ]
+    response = StreamingHttpResponse(
+        streaming.response_chunks(request, zip_stream.stream_zip(entries)), content_type='application/zip',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{name}.zip"'
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
 def downloads_page(request):
     # This view's only job is to render the new template.
     # It can also be where we generate the supporting docs checklist in the future.
-    wizard_data = request.session.get('wizard_data', {})
-    # Simple checklist for now, we can make this dynamic later
-    supporting_docs = [
-        "Your South African ID (Original and a certified copy)",
-        "Birth certificate for each child (Certified copies)",
-        "Your last 3 months of bank statements",
-        "Proof of your income (e.g., latest payslip)",
-        "Proof of your current residential address",
-        "A detailed list of your monthly expenses",
-        "(If applicable) Your marriage certificate or divorce order",
-        "(If applicable) Any previous maintenance orders",
-    ]
+    wizard_data = claims.load_claim_data(request)
     context = {
-        'supporting_docs': supporting_docs
+        'supporting_docs': SUPPORTING_DOCS,
+        'pdf_async': settings.PDF_ASYNC_RENDER,
+        'claim_retention_days': max(1, settings.CLAIM_RETENTION // 86400),
     }
     return render(request, 'downloads.html', context)
 
@@ -536,6 +549,7 @@ def dev_autofill_and_redirect(request):
             'payment_day': '1',
             'payment_made_to': 'The Applicant, M. Applicant',
             'other_contributions_text': '50% of school fees and any medical expenses not covered by the medical aid.',
+            'total_maintenance_claimed': '5000.00',
             # Page 3/4 Expenses (Self and Child breakdown)
             'self_lodging': '4000.00',         'child_lodging': '4000.00',
             'self_groceries': '2000.00',       'child_groceries': '2500.00',
@@ -546,18 +560,18 @@ def dev_autofill_and_redirect(request):
             'self_clothing': '500.00',         'child_clothing': '800.00',
                                                'child_school_uniforms': '1200.00',
             'self_transport_public': '0.00',   'child_transport_public': '450.00',
-            'self_fuel': '1000.00',            'child_fuel': '500.00',
+            'self_car_fuel': '1000.00',        'child_car_fuel': '500.00',
             'self_car_maintenance': '250.00',  'child_car_maintenance': '250.00',
             'self_car_insurance': '700.00',    'child_car_insurance': '300.00',
                                                'child_school_fees': '3000.00',
                                                'child_stationery': '350.00',
                                                'child_extramural': '750.00',
-            'self_medical': '200.00',          'child_medical': '400.00',
-            'self_medication': '100.00',       'child_medication': '150.00',
+            'self_medical_uncovered': '200.00', 'child_medical_uncovered': '400.00',
+            'self_medication_uncovered': '100.00', 'child_medication_uncovered': '150.00',
             'self_entertainment': '400.00',    'child_entertainment': '500.00',
             'self_other': '0.00',              'child_other': '0.00',
         }
     }
 
-    request.session['wizard_data'] = dummy_wizard_data
+    claims.replace_claim_data(request, ClaimData.from_wizard_data(dummy_wizard_data))
     return redirect('summary_page')
\ No newline at end of file
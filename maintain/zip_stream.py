@@ -0,0 +1,62 @@
+# maintain/zip_stream.py
+
+"""
+Builds a ZIP archive as a stream of byte chunks, suitable for a
+StreamingHttpResponse.
+
+zipfile is given a write-only buffer that cannot seek, so it writes each
+entry's sizes and CRC in a trailing data descriptor instead of going
+back to patch its header. The buffer is emptied after every chunk, so
+at most one chunk of one entry is held in memory.
+"""
+
+import io
+import time
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class StreamBuffer(io.RawIOBase):
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+    def drain(self):
+        chunk = bytes(self.data)
+        self.data.clear()
+        return chunk
+
+
+def iter_chunks(data, size=CHUNK_SIZE):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def stream_zip(entries):
+    """
+    Yields the bytes of a ZIP archive holding `entries`, an iterable of
+    (filename, chunks, compress) tuples: chunks is an iterable of bytes,
+    and compress says whether to deflate the entry (pass False for data
+    that is already compressed, such as a PDF).
+    """
+    buffer = StreamBuffer()
+    date_time = time.localtime()[:6]
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for filename, chunks, compress in entries:
+            info = zipfile.ZipInfo(filename, date_time=date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            with archive.open(info, 'w') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    if buffer.data:
+                        yield buffer.drain()
+            yield buffer.drain()
+    # The central directory, written on close.
+    yield buffer.drain()